@@ -26,12 +26,72 @@ parser.add_argument(
     type=int,
     default=9999,
     help='port number for server')
+parser.add_argument(
+    '-r', '--tickrate',
+    dest='tick_rate',
+    type=int,
+    default=30,
+    help='server model updates per second')
+parser.add_argument(
+    '-vc', '--vectorized',
+    action='store_true',
+    dest='vectorized',
+    help='store server cells in NumPy arrays')
+parser.add_argument(
+    '-pf', '--profile',
+    action='store_true',
+    dest='profile',
+    help='log time spent by server in each tick phase')
+parser.add_argument(
+    '-ws', '--worldsize',
+    dest='world_size',
+    type=int,
+    default=1000,
+    help='half of server world width and height')
+parser.add_argument(
+    '-rg', '--regions',
+    dest='regions',
+    type=int,
+    default=1,
+    help='number of processes that simulate server world')
+
+parser.add_argument(
+    '-sd', '--seed',
+    dest='seed',
+    type=int,
+    help='seed of server random numbers in range [0, 2**64), '
+        'makes simulation deterministic')
+parser.add_argument(
+    '-rc', '--record',
+    dest='record',
+    help='file to record server session, see benchmarks/replay.py, '
+        'not supported with several regions')
+parser.add_argument(
+    '-bw', '--bandwidth',
+    dest='bandwidth',
+    type=int,
+    default=64 * 1024,
+    help='max bytes per second sent by server to each client, 0 means unlimited')
 
 args = parser.parse_args()
+if args.seed is not None and not 0 <= args.seed < 2**64:
+    parser.error('seed must be in range [0, 2**64)')
+if args.record is not None and args.regions > 1:
+    parser.error('session of sharded world could not be recorded')
 
 if args.server:
     import game.network.server as server
-    server.start(host='0.0.0.0', port=args.port)
+    server.start(
+        host='0.0.0.0',
+        port=args.port,
+        tick_rate=args.tick_rate,
+        vectorized=args.vectorized,
+        profile=args.profile,
+        bounds=(args.world_size, args.world_size),
+        regions=args.regions,
+        seed=args.seed,
+        record=args.record,
+        bandwidth=args.bandwidth)
 else:
     import game.network.client as client
     client.start(args.width, args.height)
\ No newline at end of file
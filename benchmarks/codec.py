@@ -0,0 +1,84 @@
+import argparse
+import json
+import pickle
+import timeit
+
+from loguru import logger
+
+from game import Model
+from game.entities import Player
+from game.network import codec
+from game.network.snapshot import Snapshot
+
+
+def make_model(cells, players, bounds):
+    players = [
+        Player.make_random('player{}'.format(i), bounds)
+        for i in range(players)]
+    model = Model(players, bounds=bounds, chunk_size=max(bounds) * 2)
+    model.spawn_cells(cells)
+    return model
+
+
+def measure(func, repeat):
+    """Returns mean time of one call in microseconds."""
+    return timeit.timeit(func, number=repeat) / repeat * 1e6
+
+
+def run(cells, players, repeat):
+    bounds = (1000, 1000)
+    model = make_model(cells, players, bounds)
+    pos = (0, 0)
+    rect = (-bounds[0], -bounds[1], bounds[0], bounds[1])
+
+    pickled = pickle.dumps(model.copy_for_client(pos))
+    snapshot = Snapshot.from_model(0, model, rect)
+    encoded = codec.encode_snapshot(snapshot.diff(None))
+
+    return {
+        'cells': cells,
+        'players': players,
+        'pickle': {
+            'bytes': len(pickled),
+            'encode_us': measure(
+                lambda: pickle.dumps(model.copy_for_client(pos)), repeat),
+            'decode_us': measure(lambda: pickle.loads(pickled), repeat),
+            },
+        'binary': {
+            'bytes': len(encoded),
+            'encode_us': measure(
+                lambda: codec.encode_snapshot(
+                    Snapshot.from_model(0, model, rect).diff(None)),
+                repeat),
+            'decode_us': measure(lambda: codec.decode(encoded), repeat),
+            },
+        }
+
+
+parser = argparse.ArgumentParser(
+    description='Compares binary codec with pickle on full world state')
+parser.add_argument(
+    '-c', '--cells',
+    dest='cells',
+    type=int,
+    nargs='+',
+    default=[150, 1000, 10000],
+    help='numbers of food cells')
+parser.add_argument(
+    '-p', '--players',
+    dest='players',
+    type=int,
+    default=10,
+    help='number of players')
+parser.add_argument(
+    '-r', '--repeat',
+    dest='repeat',
+    type=int,
+    default=20,
+    help='number of measured calls')
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    logger.disable('game')
+    results = [run(cells, args.players, args.repeat) for cells in args.cells]
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,386 @@
+import argparse
+import asyncio
+import ipaddress
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from loguru import logger
+import pygame
+
+from benchmarks.tick import percentile
+from game.network import codec
+from game.network.msgtype import MsgType
+from game.network.packets import Reassembler
+
+
+class Bot(asyncio.DatagramProtocol):
+    """Simulated client that speaks game protocol without rendering.
+
+    Snapshots are decoded and acknowledged, so server sends deltas
+    like to real client, but they are not applied.
+    """
+
+    # size of simulated screen
+    SCREEN_SIZE = (900, 600)
+
+    def __init__(self, index):
+        self.index = index
+        self.transport = None
+        # set when server accepts connection
+        self.accepted = asyncio.Event()
+        self.player_id = None
+        self.tick_rate = None
+        self.reassembler = Reassembler()
+        # number of the latest recieved snapshot
+        self.ack = None
+        # number of the latest sent input
+        self.seq = 0
+        # send time of inputs that were not acknowledged yet
+        self.sent = dict()
+        # own player was eaten, server forgot the client
+        self.dead = False
+        self.reset()
+
+    def reset(self):
+        """Starts collecting stats again."""
+        self.latencies = list()
+        self.bytes = 0
+        self.datagrams = 0
+        self.errors = 0
+        self.inputs = 0
+        # first and last recieved snapshot numbers and their count
+        self.first_num = None
+        self.last_num = None
+        self.snapshots = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.connect()
+
+    def connect(self):
+        self.transport.sendto(codec.encode_connect(
+            'bot{}'.format(self.index), self.SCREEN_SIZE))
+
+    def datagram_received(self, data, addr):
+        self.bytes += len(data)
+        self.datagrams += 1
+        try:
+            msg = self.reassembler.feed(data)
+        except codec.CodecError:
+            self.errors += 1
+            return
+        if msg is None:
+            return
+        msgtype, data = msg
+        if msgtype == MsgType.ACCEPT:
+            self.player_id = data['player_id']
+            self.tick_rate = data['tick_rate']
+            self.accepted.set()
+        elif msgtype == MsgType.SNAPSHOT:
+            self.handle_snapshot(data)
+        elif msgtype == MsgType.DISCONNECT:
+            self.dead = True
+
+    def handle_snapshot(self, delta):
+        if self.ack is not None and delta.num <= self.ack:
+            return
+        self.ack = delta.num
+        if self.first_num is None:
+            self.first_num = delta.num
+        self.last_num = delta.num
+        self.snapshots += 1
+
+        # latency is time from sending input to recieving state with it
+        now = time.perf_counter()
+        if delta.input_ack in self.sent:
+            self.latencies.append(now - self.sent[delta.input_ack])
+        for seq in [seq for seq in self.sent if seq <= (delta.input_ack or 0)]:
+            del self.sent[seq]
+        if self.player_id in delta.removed_players:
+            self.dead = True
+
+    def send_input(self, now):
+        """Sends scripted input, bot slowly turns and sometimes
+        shoots or splits.
+        """
+        self.seq += 1
+        angle = math.sin(now / 2 + self.index) * math.pi
+        keys = list()
+        if (self.seq + self.index) % 60 == 0:
+            keys.append(pygame.K_w)
+        if (self.seq + self.index) % 300 == 0:
+            keys.append(pygame.K_SPACE)
+        self.transport.sendto(codec.encode_update(
+            (angle, 1), keys, self.ack, self.seq))
+        self.sent[self.seq] = time.perf_counter()
+        self.inputs += 1
+
+    def error_received(self, exc):
+        self.errors += 1
+
+
+async def connect_bots(bots, host, port, timeout):
+    """Opens sockets of passed bots and waits until server accepts them.
+    Returns number of accepted bots.
+    """
+    loop = asyncio.get_running_loop()
+    for bot in bots:
+        await loop.create_datagram_endpoint(lambda: bot, remote_addr=(host, port))
+
+    async def wait(bot):
+        # CONNECT could be lost, so it is repeated
+        deadline = time.perf_counter() + timeout
+        while not bot.accepted.is_set() and time.perf_counter() < deadline:
+            try:
+                await asyncio.wait_for(bot.accepted.wait(), 0.5)
+            except asyncio.TimeoutError:
+                bot.connect()
+        return bot.accepted.is_set()
+
+    accepted = await asyncio.gather(*(wait(bot) for bot in bots))
+    return sum(accepted)
+
+
+async def drive(bots, rate, duration):
+    """Sends inputs of all bots with passed rate during passed time."""
+    period = 1 / rate
+    start = time.perf_counter()
+    next_send = start
+    while time.perf_counter() - start < duration:
+        now = time.perf_counter()
+        for bot in bots:
+            if bot.accepted.is_set() and not bot.dead:
+                bot.send_input(now)
+        next_send += period
+        await asyncio.sleep(max(next_send - time.perf_counter(), 0))
+    return time.perf_counter() - start
+
+
+def summary(bots, elapsed, tick_rate):
+    """Returns stats of passed bots collected during elapsed seconds."""
+    latencies = sorted(latency for bot in bots for latency in bot.latencies)
+    received = sum(bot.snapshots for bot in bots)
+    expected = sum(
+        bot.last_num - bot.first_num + 1
+        for bot in bots if bot.first_num is not None)
+    # snapshot numbers are server ticks, so they show its real rate
+    ticks = max(
+        (bot.last_num - bot.first_num for bot in bots if bot.first_num is not None),
+        default=0)
+    ms = lambda value: value * 1000
+    result = {
+        'clients': len(bots),
+        'alive': sum(not bot.dead for bot in bots),
+        'inputs': sum(bot.inputs for bot in bots),
+        'snapshots': received,
+        'snapshot_loss': 1 - received / expected if expected else 1,
+        'server_ticks_per_sec': ticks / elapsed,
+        'nominal_tick_rate': tick_rate,
+        'bytes_per_sec': sum(bot.bytes for bot in bots) / elapsed,
+        'datagrams_per_sec': sum(bot.datagrams for bot in bots) / elapsed,
+        'errors': sum(bot.errors for bot in bots),
+        }
+    if latencies:
+        result['latency_ms'] = {
+            'p50': ms(percentile(latencies, 50)),
+            'p90': ms(percentile(latencies, 90)),
+            'p99': ms(percentile(latencies, 99)),
+            'max': ms(latencies[-1]),
+            }
+    return result
+
+
+def is_saturated(result, max_loss, max_latency):
+    """Checks if server can't keep up with passed load."""
+    if result['server_ticks_per_sec'] < 0.9 * result['nominal_tick_rate']:
+        return True
+    if result['snapshot_loss'] > max_loss:
+        return True
+    latency = result.get('latency_ms')
+    return latency is None or latency['p99'] > max_latency
+
+
+async def run(args):
+    bots = list()
+    results = list()
+    count = args.clients
+    while True:
+        new_bots = [Bot(i) for i in range(len(bots), count)]
+        accepted = await connect_bots(new_bots, args.host, args.port, args.timeout)
+        if accepted < len(new_bots):
+            logger.warning('Server accepted {} of {} clients'.format(
+                accepted, len(new_bots)))
+        bots.extend(new_bots)
+        tick_rate = next(
+            (bot.tick_rate for bot in bots if bot.tick_rate is not None), args.tick_rate)
+
+        # let server send full snapshots to new clients before measuring
+        await drive(bots, args.rate, args.warmup)
+        for bot in bots:
+            bot.reset()
+        elapsed = await drive(bots, args.rate, args.duration)
+
+        result = summary(bots, elapsed, tick_rate)
+        result['saturated'] = is_saturated(result, args.max_loss, args.max_latency)
+        results.append(result)
+        logger.info('{} clients: {:.1f} ticks/s, loss {:.3f}, p99 {} ms'.format(
+            len(bots), result['server_ticks_per_sec'], result['snapshot_loss'],
+            round(result['latency_ms']['p99']) if 'latency_ms' in result else None))
+
+        if args.step <= 0 or result['saturated'] or count >= args.max_clients:
+            break
+        count = min(count + args.step, args.max_clients)
+
+    for bot in bots:
+        # server frees sessions at once instead of waiting for timeout
+        bot.transport.sendto(codec.encode_disconnect())
+        bot.transport.close()
+    return results
+
+
+def start_server(args):
+    """Starts local game server process."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    command = [
+        sys.executable, os.path.join(root, 'agario.py'), '--server',
+        '--port', str(args.port),
+        '--tickrate', str(args.tick_rate),
+        '--worldsize', str(args.world_size),
+        '--bandwidth', str(args.bandwidth)]
+    # debug logging of every packet would take server time
+    env = dict(os.environ, LOGURU_LEVEL='INFO')
+    server = subprocess.Popen(command, cwd=root, env=env)
+    # give it time to bind the port, clients repeat CONNECT anyway
+    time.sleep(1)
+    return server
+
+
+def is_loopback(host):
+    return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback
+
+
+parser = argparse.ArgumentParser(
+    description='Headless load generator for local game server')
+parser.add_argument(
+    '-H', '--host',
+    dest='host',
+    default='127.0.0.1',
+    help='server host, only loopback addresses are allowed')
+parser.add_argument(
+    '-p', '--port',
+    dest='port',
+    type=int,
+    default=9999,
+    help='server port')
+parser.add_argument(
+    '-c', '--clients',
+    dest='clients',
+    type=int,
+    default=50,
+    help='number of simulated clients in the first step')
+parser.add_argument(
+    '-st', '--step',
+    dest='step',
+    type=int,
+    default=0,
+    help='clients added in each next step until server saturates, '
+        'zero means single step')
+parser.add_argument(
+    '-m', '--max-clients',
+    dest='max_clients',
+    type=int,
+    default=1000,
+    help='max number of simulated clients')
+parser.add_argument(
+    '-r', '--rate',
+    dest='rate',
+    type=int,
+    default=30,
+    help='inputs per second sent by each client')
+parser.add_argument(
+    '-d', '--duration',
+    dest='duration',
+    type=float,
+    default=10,
+    help='seconds of measurement in each step')
+parser.add_argument(
+    '-w', '--warmup',
+    dest='warmup',
+    type=float,
+    default=2,
+    help='seconds before measurement in each step')
+parser.add_argument(
+    '-t', '--timeout',
+    dest='timeout',
+    type=float,
+    default=5,
+    help='seconds to wait for server to accept client')
+parser.add_argument(
+    '-ml', '--max-loss',
+    dest='max_loss',
+    type=float,
+    default=0.05,
+    help='snapshot loss at which server is considered saturated')
+parser.add_argument(
+    '-ms', '--max-latency',
+    dest='max_latency',
+    type=float,
+    default=200,
+    help='p99 latency in ms at which server is considered saturated')
+parser.add_argument(
+    '-sv', '--server',
+    action='store_true',
+    dest='server',
+    help='start local server process for the run')
+parser.add_argument(
+    '-tr', '--tickrate',
+    dest='tick_rate',
+    type=int,
+    default=30,
+    help='model updates per second of started server')
+parser.add_argument(
+    '-ws', '--worldsize',
+    dest='world_size',
+    type=int,
+    default=3000,
+    help='half of world size of started server')
+parser.add_argument(
+    '-bw', '--bandwidth',
+    dest='bandwidth',
+    type=int,
+    default=64 * 1024,
+    help='bytes per second per client of started server, 0 means unlimited')
+parser.add_argument(
+    '-o', '--output',
+    dest='output',
+    help='file to save JSON results')
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    if not is_loopback(args.host):
+        parser.error('load could be generated only on localhost')
+    logger.disable('game')
+
+    server = start_server(args) if args.server else None
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    saturated = [result['clients'] for result in results if result['saturated']]
+    report = {
+        'steps': results,
+        'saturation_clients': saturated[0] if saturated else None,
+        }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    print(output)
@@ -0,0 +1,89 @@
+import argparse
+import json
+import random
+import tracemalloc
+
+from loguru import logger
+
+from game import Model
+from game.entities import Player
+from game.food import CellPool, FoodManager
+
+
+def run(cells, players, ticks, vectorized, food=False):
+    bounds = (1000, 1000)
+    tracemalloc.start()
+
+    start, _ = tracemalloc.get_traced_memory()
+    model = Model(
+        bounds=bounds, vectorized=vectorized,
+        cell_pool=CellPool() if food else None)
+    model.spawn_cells(cells)
+    # eaten cells are respawned from pool like on server
+    manager = FoodManager(model, cells) if food else None
+    for i in range(players):
+        model.add_player(Player.make_random('player{}'.format(i), bounds))
+    world, _ = tracemalloc.get_traced_memory()
+
+    # peak memory of a tick shows how much is allocated temporarily
+    peaks = list()
+    for _ in range(ticks):
+        for player in model.players:
+            model.update_velocity(player, random.uniform(-3, 3), 1)
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        if manager is not None:
+            manager.update()
+        model.update()
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+    tracemalloc.stop()
+
+    return {
+        'cells': cells,
+        'players': players,
+        'vectorized': vectorized,
+        'food': food,
+        'world_bytes': world - start,
+        'bytes_per_cell': (world - start) / max(cells, 1),
+        'tick_peak_bytes': max(peaks) if peaks else 0,
+        'cells_left': len(model.cells),
+        }
+
+
+parser = argparse.ArgumentParser(
+    description='Measures memory of world and memory allocated per tick')
+parser.add_argument(
+    '-c', '--cells',
+    dest='cells',
+    type=int,
+    default=100000,
+    help='number of food cells')
+parser.add_argument(
+    '-p', '--players',
+    dest='players',
+    type=int,
+    default=10,
+    help='number of players')
+parser.add_argument(
+    '-t', '--ticks',
+    dest='ticks',
+    type=int,
+    default=10,
+    help='number of measured ticks')
+parser.add_argument(
+    '-vc', '--vectorized',
+    action='store_true',
+    dest='vectorized',
+    help='store cells in NumPy arrays')
+parser.add_argument(
+    '-f', '--food',
+    action='store_true',
+    dest='food',
+    help='respawn eaten cells from pool like server does')
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    logger.disable('game')
+    result = run(args.cells, args.players, args.ticks, args.vectorized, args.food)
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,167 @@
+import argparse
+import hashlib
+import json
+import random
+import struct
+import time
+
+from loguru import logger
+
+from benchmarks.tick import percentile
+from game import Model
+from game import gameutils as gu
+from game.food import CellPool, FoodManager
+from game.network import codec
+from game.network.recording import Event, Recording
+from game.network.server import apply_input
+from game.network.snapshot import Snapshot
+from game.network.ticker import Ticker
+
+
+class ReplayClient():
+    """State of recorded client that is needed to repeat its input."""
+
+    def __init__(self, player, screen_size):
+        self.player = player
+        self.screen_size = screen_size
+        self.mouse_pos = (0, 0)
+        self.keys = list()
+
+
+def digest(model):
+    """Returns hash of positions and sizes of all entities, it is
+    equal for models that are in the same state.
+    """
+    md5 = hashlib.md5()
+    for cell in model.cells:
+        md5.update(struct.pack('<ddd', cell.x, cell.y, cell.radius))
+    for player in model.players:
+        for part in player.parts:
+            md5.update(struct.pack('<ddd', part.x, part.y, part.radius))
+    return md5.hexdigest()
+
+
+def replay(recording, profile=False, snapshots=False):
+    """Repeats recorded session as fast as possible.
+    Returns updated model and update latencies.
+    """
+    ticker = Ticker(recording.tick_rate, start_time=recording.start_time)
+    model = Model(
+        bounds=recording.bounds,
+        vectorized=recording.vectorized,
+        clock=ticker.game_time,
+        rng=random.Random(recording.seed),
+        cell_pool=CellPool())
+    model.spawn_cells(recording.cell_num)
+    food = FoodManager(model, recording.cell_num)
+    model.profiler.enabled = profile
+
+    # clients according to recorded player ids, in join order
+    clients = dict()
+    latencies = list()
+    for tick, kind, player_id, data in recording.events():
+        ticker.tick_num = tick
+        if kind == Event.JOIN:
+            clients[player_id] = ReplayClient(*data)
+            model.add_player(clients[player_id].player)
+        elif kind == Event.LEAVE:
+            client = clients.pop(player_id)
+            model.remove_player(client.player)
+        elif kind == Event.INPUT:
+            client = clients[player_id]
+            client.mouse_pos, keys = data
+            client.keys.extend(keys)
+        elif kind == Event.TICK:
+            tick_start = time.perf_counter()
+            for client in clients.values():
+                keys, client.keys = client.keys, list()
+                if client.player.parts:
+                    apply_input(model, client.player, client.mouse_pos, keys)
+            food.update()
+            model.update()
+            if snapshots:
+                start = model.profiler.start()
+                encode_snapshots(tick, model, clients.values())
+                model.profiler.stop('broadcast', start, len(clients))
+            latencies.append(time.perf_counter() - tick_start)
+            # server forgets clients of eaten players
+            for player_id, client in list(clients.items()):
+                if not client.player.parts:
+                    del clients[player_id]
+    return model, latencies
+
+
+def encode_snapshots(tick, model, clients):
+    """Encodes full snapshot of each client, like server does
+    for clients that haven't acknowledged any snapshot.
+    """
+    for client in clients:
+        player = client.player
+        if not player.parts:
+            continue
+        snapshot = Snapshot.from_model(
+            tick,
+            model,
+            gu.view_rect(
+                player.center(),
+                client.screen_size,
+                gu.view_scale(player.score())))
+        codec.encode_snapshot(snapshot.diff(None))
+
+
+parser = argparse.ArgumentParser(
+    description='Headless replay of recorded server session')
+parser.add_argument(
+    'recording',
+    help='file recorded by server started with --record')
+parser.add_argument(
+    '-p', '--profile',
+    action='store_true',
+    dest='profile',
+    help='add time and counters of each update phase to results')
+parser.add_argument(
+    '-sn', '--snapshots',
+    action='store_true',
+    dest='snapshots',
+    help='also encode snapshots for recorded clients')
+parser.add_argument(
+    '-o', '--output',
+    dest='output',
+    help='file to save JSON results')
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    logger.disable('game')
+
+    recording = Recording(args.recording)
+    start = time.perf_counter()
+    model, latencies = replay(recording, args.profile, args.snapshots)
+    total = time.perf_counter() - start
+    recording.close()
+
+    latencies.sort()
+    ms = lambda value: value * 1000
+    result = {
+        'recording': args.recording,
+        'ticks': len(latencies),
+        'ticks_per_sec': len(latencies) / total,
+        'players_left': len(model.players),
+        'cells_left': len(model.cells),
+        'digest': digest(model),
+        }
+    if latencies:
+        result['latency_ms'] = {
+            'mean': ms(sum(latencies) / len(latencies)),
+            'p50': ms(percentile(latencies, 50)),
+            'p90': ms(percentile(latencies, 90)),
+            'p99': ms(percentile(latencies, 99)),
+            'max': ms(latencies[-1]),
+            }
+    if args.profile:
+        result['phases'] = model.profiler.report()
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    print(output)
@@ -0,0 +1,196 @@
+import argparse
+import json
+import math
+import random
+import time
+
+from loguru import logger
+
+from game import Model
+from game.entities import Player, PlayerCell
+from game.sharding import ShardedModel
+
+
+# scenarios of default suite
+SCENARIOS = {
+    'small': dict(players=10, parts=1, cells=150, bounds=1000, chunk_size=1000),
+    'crowded': dict(players=100, parts=1, cells=2000, bounds=1000, chunk_size=250),
+    'food_heavy': dict(players=20, parts=1, cells=100000, bounds=5000, chunk_size=500),
+    'split': dict(players=20, parts=16, cells=5000, bounds=2000, chunk_size=500),
+    'large_world': dict(players=200, parts=4, cells=50000, bounds=10000, chunk_size=1000),
+    }
+
+
+def make_player(i, parts, bounds, rng):
+    """Creates player that consists of passed number of parts."""
+    player = Player.make_random('bot{}'.format(i), bounds)
+    first = player.parts[0]
+    for _ in range(parts - 1):
+        angle = rng.uniform(-math.pi, math.pi)
+        dist = rng.uniform(0, 3*Player.START_SIZE)
+        part = PlayerCell(
+            [first.x + dist*math.cos(angle), first.y + dist*math.sin(angle)],
+            Player.START_SIZE,
+            first.color)
+        player.parts.append(part)
+    return player
+
+
+def make_model(players, parts, cells, bounds, chunk_size, vectorized, seed, regions=1):
+    random.seed(seed)
+    rng = random.Random(seed)
+    bounds = (bounds, bounds)
+    if regions > 1:
+        model = ShardedModel(regions, bounds, chunk_size, vectorized)
+    else:
+        model = Model(bounds=bounds, chunk_size=chunk_size, vectorized=vectorized)
+    model.spawn_cells(cells)
+    for i in range(players):
+        model.add_player(make_player(i, parts, bounds, rng))
+    return model
+
+
+def drive(model, tick, rng):
+    """Applies scripted inputs of all players for passed tick."""
+    for i, player in enumerate(list(model.players)):
+        # each bot slowly turns and sometimes shoots or splits
+        angle = math.sin(tick / 50 + i) * math.pi
+        model.update_velocity(player, angle, rng.uniform(0.5, 1))
+        if (tick + i) % 60 == 0:
+            model.shoot(player, angle)
+        if (tick + i) % 300 == 0:
+            model.split(player, angle)
+
+
+def percentile(values, percent):
+    """Returns percentile of sorted values."""
+    index = min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def run(name, params, ticks, warmup, vectorized, seed, profile=False, regions=1):
+    model = make_model(vectorized=vectorized, seed=seed, regions=regions, **params)
+    rng = random.Random(seed)
+
+    for tick in range(warmup):
+        drive(model, tick, rng)
+        model.update()
+
+    # warmup is not profiled
+    model.profiler.enabled = profile
+    latencies = list()
+    start = time.perf_counter()
+    for tick in range(warmup, warmup + ticks):
+        drive(model, tick, rng)
+        tick_start = time.perf_counter()
+        model.update()
+        latencies.append(time.perf_counter() - tick_start)
+    total = time.perf_counter() - start
+
+    latencies.sort()
+    ms = lambda value: value * 1000
+    result = {
+        'name': name,
+        'params': params,
+        'vectorized': vectorized,
+        'regions': regions,
+        'ticks': ticks,
+        'ticks_per_sec': ticks / total,
+        'latency_ms': {
+            'mean': ms(sum(latencies) / len(latencies)),
+            'p50': ms(percentile(latencies, 50)),
+            'p90': ms(percentile(latencies, 90)),
+            'p99': ms(percentile(latencies, 99)),
+            'max': ms(latencies[-1]),
+            },
+        'players_left': len(model.players),
+        'cells_left': len(model.cells),
+        }
+    if profile:
+        result['phases'] = model.profiler.report()
+    if regions > 1:
+        model.close()
+    return result
+
+
+def compare(results, baseline):
+    """Adds to results ratio of latencies to the stored baseline run."""
+    baseline = {result['name']: result for result in baseline}
+    for result in results:
+        base = baseline.get(result['name'])
+        if base is None:
+            continue
+        result['vs_baseline'] = {
+            key: result['latency_ms'][key] / base['latency_ms'][key]
+            for key in ('p50', 'p90', 'p99')
+            if base['latency_ms'][key] > 0}
+
+
+parser = argparse.ArgumentParser(
+    description='Headless benchmark of Model.update')
+parser.add_argument(
+    'scenarios',
+    nargs='*',
+    default=list(SCENARIOS),
+    help='scenarios to run: {}'.format(', '.join(SCENARIOS)))
+parser.add_argument(
+    '-t', '--ticks',
+    dest='ticks',
+    type=int,
+    default=300,
+    help='number of measured ticks')
+parser.add_argument(
+    '-w', '--warmup',
+    dest='warmup',
+    type=int,
+    default=30,
+    help='number of ticks before measurement')
+parser.add_argument(
+    '-s', '--seed',
+    dest='seed',
+    type=int,
+    default=0,
+    help='random seed of world and inputs')
+parser.add_argument(
+    '-vc', '--vectorized',
+    action='store_true',
+    dest='vectorized',
+    help='store cells in NumPy arrays')
+parser.add_argument(
+    '-p', '--profile',
+    action='store_true',
+    dest='profile',
+    help='add time and counters of each update phase to results')
+parser.add_argument(
+    '-rg', '--regions',
+    dest='regions',
+    type=int,
+    default=1,
+    help='number of worker processes that simulate the world')
+parser.add_argument(
+    '-b', '--baseline',
+    dest='baseline',
+    help='JSON file with results of previous run to compare with')
+parser.add_argument(
+    '-o', '--output',
+    dest='output',
+    help='file to save JSON results')
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    logger.disable('game')
+
+    results = list()
+    for name in args.scenarios:
+        results.append(run(
+            name, SCENARIOS[name], args.ticks, args.warmup,
+            args.vectorized, args.seed, args.profile, args.regions))
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    print(output)
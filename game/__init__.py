@@ -1,6 +1,16 @@
+import importlib
+
 from . import gameutils
 from .model import Model
-from .view import View
 
 
-all = ['gameutils', 'model', 'view', 'entities']
\ No newline at end of file
+def __getattr__(name):
+    # view requires pygame, so it is imported only when needed
+    # and model could be simulated headlessly
+    if name in ('view', 'View'):
+        view = importlib.import_module('.view', __name__)
+        return view if name == 'view' else view.View
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+
+all = ['gameutils', 'model', 'view', 'entities']
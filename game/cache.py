@@ -0,0 +1,29 @@
+from collections import OrderedDict
+
+
+class LRUCache():
+    """Bounded mapping that drops the least recently used items."""
+
+    def __init__(self, size):
+        self.size = size
+        self.items = OrderedDict()
+
+    def get(self, key):
+        """Returns value of key or None if it is missing."""
+        value = self.items.get(key)
+        if value is not None:
+            self.items.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        """Stores value of key. Returns passed value."""
+        self.items[key] = value
+        if len(self.items) > self.size:
+            self.items.popitem(last=False)
+        return value
+
+    def clear(self):
+        self.items.clear()
+
+    def __len__(self):
+        return len(self.items)
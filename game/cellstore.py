@@ -0,0 +1,175 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .entities import Cell
+
+
+class StoredCell(Cell):
+    """Cell whose state lives in CellStore arrays.
+
+    Behaves like usual Cell, so it could be drawn, sent to clients
+    and eaten by players.
+    """
+
+    __slots__ = ('store', 'index')
+
+    def __init__(self, store, index, cell_id):
+        self.store = store
+        self.index = index
+        self.id = cell_id
+
+    @property
+    def x(self):
+        return float(self.store.x[self.index])
+
+    @x.setter
+    def x(self, x):
+        self.store.x[self.index] = x
+
+    @property
+    def y(self):
+        return float(self.store.y[self.index])
+
+    @y.setter
+    def y(self, y):
+        self.store.y[self.index] = y
+
+    @property
+    def radius(self):
+        return float(self.store.radius[self.index])
+
+    @radius.setter
+    def radius(self, radius):
+        self.store.radius[self.index] = radius
+
+    @property
+    def color(self):
+        return [int(light) for light in self.store.color[self.index]]
+
+    @color.setter
+    def color(self, color):
+        self.store.color[self.index] = color
+
+    @property
+    def angle(self):
+        return float(self.store.angle[self.index])
+
+    @angle.setter
+    def angle(self, angle):
+        self.store.angle[self.index] = angle
+
+    @property
+    def speed(self):
+        return float(self.store.speed[self.index])
+
+    @speed.setter
+    def speed(self, speed):
+        self.store.speed[self.index] = speed
+
+
+class DetachedRow():
+    """Keeps state of cell that was removed from the store."""
+
+    def __init__(self, store, index):
+        self.x = [store.x[index]]
+        self.y = [store.y[index]]
+        self.radius = [store.radius[index]]
+        self.color = [store.color[index].copy()]
+        self.angle = [store.angle[index]]
+        self.speed = [store.speed[index]]
+
+
+class CellStore():
+    """Struct of arrays storage of food and ejected cells.
+
+    Movement, friction and bounds clamping are done with vectorized
+    operations for all cells at once.
+    """
+
+    # initial number of cells that could be stored without resizing
+    CAPACITY = 1024
+
+    def __init__(self, capacity=CAPACITY):
+        if np is None:
+            raise RuntimeError('NumPy is required for array-backed cell store')
+        self.size = 0
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.radius = np.zeros(capacity)
+        self.angle = np.zeros(capacity)
+        self.speed = np.zeros(capacity)
+        self.color = np.zeros((capacity, 3), dtype=np.uint8)
+        # stored cells in the same order as arrays rows
+        self.cells = list()
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        return iter(self.cells)
+
+    def add(self, cell):
+        """Copies passed cell into the store. Returns stored cell."""
+        if self.size == len(self.x):
+            self.__grow()
+        index = self.size
+        self.size += 1
+        self.x[index] = cell.x
+        self.y[index] = cell.y
+        self.radius[index] = cell.radius
+        self.angle[index] = cell.angle
+        self.speed[index] = cell.speed
+        self.color[index] = cell.color
+        stored = StoredCell(self, index, cell.id)
+        self.cells.append(stored)
+        return stored
+
+    def remove(self, cell):
+        """Removes stored cell, by moving the last cell on its place."""
+        index = cell.index
+        last = self.size - 1
+        cell.store = DetachedRow(self, index)
+        cell.index = 0
+        if index != last:
+            for column in self.__columns():
+                column[index] = column[last]
+            moved = self.cells[last]
+            moved.index = index
+            self.cells[index] = moved
+        self.cells.pop()
+        self.size -= 1
+
+    def moving(self):
+        """Returns cells that will be moved on next move call."""
+        indices = np.flatnonzero(self.speed[:self.size] > 0)
+        return [self.cells[i] for i in indices]
+
+    def move(self, bounds):
+        """Applies friction, moves cells according to their velocity
+        and clamps them in bounds. Has the same rules as Cell.move.
+        """
+        indices = np.flatnonzero(self.speed[:self.size] > 0)
+        if not len(indices):
+            return
+        speed = np.maximum(self.speed[indices] - Cell.FRICTION, 0)
+        self.speed[indices] = speed
+        angle = self.angle[indices]
+        dist = speed * Cell.MAX_SPEED
+        self.x[indices] = np.clip(
+            self.x[indices] + dist*np.cos(angle), -bounds[0], bounds[0])
+        self.y[indices] = np.clip(
+            self.y[indices] + dist*np.sin(angle), -bounds[1], bounds[1])
+
+    def __columns(self):
+        return (self.x, self.y, self.radius, self.angle, self.speed, self.color)
+
+    def __grow(self):
+        """Doubles capacity of arrays."""
+        capacity = 2 * len(self.x)
+        for name in ('x', 'y', 'radius', 'angle', 'speed', 'color'):
+            column = getattr(self, name)
+            grown = np.zeros((capacity,) + column.shape[1:], dtype=column.dtype)
+            grown[:len(column)] = column
+            setattr(self, name, grown)
@@ -0,0 +1,105 @@
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .cellstore import StoredCell
+
+
+# below that number of part-cell pairs plain loop is faster than NumPy
+MIN_VECTORIZED_PAIRS = 256
+# the same for cells of CellStore, reading them one by one is slow,
+# while gathering them from store arrays is cheap
+MIN_VECTORIZED_STORED_PAIRS = 16
+# slack of vectorized check, so rounding never rejects edible cell,
+# final decision is made by Cell.try_to_kill_by
+EPSILON = 1e-6
+# relative growth of parts that vectorized check allows for,
+# the check is repeated only when some part grows more than that
+GROWTH_MARGIN = 0.05
+
+
+def eat_cells(parts, cells):
+    """Feeds player parts with cells they are able to eat.
+    Returns list of eaten cells.
+
+    Gives the same result as calling Player.attempt_murder for each
+    cell in order. Cells are checked against all parts at once with one
+    broadcasted computation, that assumes parts are a bit larger than
+    they are. Then candidates are confirmed in order by Cell.try_to_kill_by.
+    Eating part grows, so when it outgrows the assumed size the rest of
+    cells is checked again.
+    """
+    if not cells:
+        return list()
+    if isinstance(cells[0], StoredCell):
+        min_pairs = MIN_VECTORIZED_STORED_PAIRS
+    else:
+        min_pairs = MIN_VECTORIZED_PAIRS
+    if np is None or len(parts) * len(cells) < min_pairs:
+        return [cell for cell in cells if feed_first_killer(parts, cell) is not None]
+
+    # cells don't change while parts are eating, so gather them once
+    cells_x, cells_y, cells_radius = circles_arrays(cells)
+    cells_area = math.pi * cells_radius**2
+
+    eaten = list()
+    start = 0
+    while start < len(cells):
+        parts_x, parts_y, parts_radius = circles_arrays(parts)
+        parts_area = np.fromiter((part.area() for part in parts), float, len(parts))
+        # sizes that parts could reach before the check must be repeated
+        reach_radius = parts_radius * (1 + GROWTH_MARGIN)
+        reach_area = parts_area * (1 + GROWTH_MARGIN)
+
+        # rows are cells and columns are parts
+        distance = np.hypot(
+            cells_x[start:, None] - parts_x[None, :],
+            cells_y[start:, None] - parts_y[None, :])
+        edible = (2*cells_area[start:, None] <= reach_area[None, :] + EPSILON) & \
+            (distance <= reach_radius[None, :] - cells_radius[start:, None] + EPSILON)
+
+        outgrown = False
+        for i in np.flatnonzero(edible.any(axis=1)):
+            cell = cells[start + i]
+            killer = feed_first_killer(parts, cell)
+            if killer is None:
+                continue
+            eaten.append(cell)
+            if parts[killer].radius > reach_radius[killer] or \
+                    parts[killer].area() > reach_area[killer]:
+                start += i + 1
+                outgrown = True
+                break
+        if not outgrown:
+            break
+    return eaten
+
+
+def feed_first_killer(parts, cell):
+    """Feeds first part that is able to eat passed cell.
+    Returns index of the part or None.
+    """
+    for i, part in enumerate(parts):
+        killed_cell = cell.try_to_kill_by(part)
+        if killed_cell:
+            part.eat(killed_cell)
+            return i
+    return None
+
+
+def circles_arrays(circles):
+    """Returns x, y and radius arrays of passed circles."""
+    if isinstance(circles[0], StoredCell):
+        # take values right from the store without creating pos lists
+        store = circles[0].store
+        indices = np.fromiter(
+            (circle.index for circle in circles), int, len(circles))
+        return store.x[indices], store.y[indices], store.radius[indices]
+
+    return (
+        np.fromiter((circle.x for circle in circles), float, len(circles)),
+        np.fromiter((circle.y for circle in circles), float, len(circles)),
+        np.fromiter((circle.radius for circle in circles), float, len(circles)))
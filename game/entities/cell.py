@@ -1,5 +1,5 @@
+import math
 import random
-from operator import add, sub
 
 from .. import gameutils as gu
 from . import interfaces
@@ -9,14 +9,19 @@ from .circle import Circle
 class Cell(Circle, interfaces.Victim):
     """Represents cell(food) state."""
 
+    __slots__ = ('id', 'color', 'angle', 'speed')
+
     BORDER_WIDTH=0
     FRICTION = 0.1
     MAX_SPEED = 5
     SIZES = (5, 7, 10)
     SIZES_CUM = (70, 20, 10)
 
+    LAST_ID = -1
+
     def __init__(self, pos, radius, color, angle=0, speed=0):
         super().__init__(pos, radius)
+        self.id = self.new_id()
         # cell color [r, g, b]
         self.color = color
         # angle of speed in rad
@@ -29,21 +34,22 @@ class Cell(Circle, interfaces.Victim):
         self.speed -= self.FRICTION
         if self.speed < 0:
             self.speed = 0
-        # get cartesian vector
-        diff_xy = gu.polar_to_cartesian(self.angle, self.speed*self.MAX_SPEED)
-        # change position
-        self.pos = list(map(add, self.pos, diff_xy))
+        if self.speed == 0:
+            return
+        # change position by cartesian vector
+        dist = self.speed*self.MAX_SPEED
+        self.x += dist*math.cos(self.angle)
+        self.y += dist*math.sin(self.angle)
 
     def update_velocity(self, angle, speed):
         """Add self velocity vector with passed velocity vector."""
-        # convert to cartesian
+        # convert to cartesian and add vectors
         before_speed = self.speed
-        v1 = gu.polar_to_cartesian(angle, speed)
-        v2 = gu.polar_to_cartesian(self.angle, self.speed)
-        # adding vectors
-        v3 = list(map(add, v1, v2))
+        x = speed*math.cos(angle) + self.speed*math.cos(self.angle)
+        y = speed*math.sin(angle) + self.speed*math.sin(self.angle)
         # convert to polar
-        self.angle, self.speed = gu.cartesian_to_polar(*v3)
+        self.angle = math.atan2(y, x)
+        self.speed = math.sqrt(x**2 + y**2)
         # normilize speed coeff
         if before_speed <= 1 and self.speed > 1:
             self.speed = 1
@@ -58,15 +64,20 @@ class Cell(Circle, interfaces.Victim):
         return None
 
     @classmethod
-    def make_random(cls, bounds):
-        """Creates random cell."""
-        pos = gu.random_pos(bounds)
-        radius = random.choices(cls.SIZES, cls.SIZES_CUM)[0]
-        color = gu.random_safe_color()
+    def new_id(cls):
+        cls.LAST_ID += 1
+        return cls.LAST_ID
+
+    @classmethod
+    def make_random(cls, bounds, rng=random):
+        """Creates random cell, rng is source of random numbers."""
+        pos = gu.random_pos(bounds, rng)
+        radius = rng.choices(cls.SIZES, cls.SIZES_CUM)[0]
+        color = gu.random_safe_color(rng)
         return cls(pos, radius, color)
 
     def __repr__(self):
         return '<{} pos={} radius={}>'.format(
             self.__class__.__name__,
-            list(map(int, self.pos)),
+            [int(self.x), int(self.y)],
             int(self.radius))
\ No newline at end of file
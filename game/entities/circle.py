@@ -1,5 +1,4 @@
 import math
-from operator import sub
 
 from .. import gameutils as gu
 
@@ -7,14 +6,24 @@ from .. import gameutils as gu
 class Circle():
     """Class that describes circle figure."""
 
+    __slots__ = ('x', 'y', 'radius')
+
     def __init__(self, pos, radius):
-        self.pos = pos
+        self.x, self.y = pos
         self.radius = radius
 
+    @property
+    def pos(self):
+        """Position of circle center as (x, y) tuple."""
+        return (self.x, self.y)
+
+    @pos.setter
+    def pos(self, pos):
+        self.x, self.y = pos
+
     def distance_to(self, circle):
         """Returns distance to passed circle."""
-        diff = tuple(map(sub, self.pos, circle.pos))
-        return math.hypot(*diff)
+        return math.hypot(self.x - circle.x, self.y - circle.y)
 
     def is_intersects(self, circle):
         """Returns True if circles intersects, otherwise False."""
@@ -24,4 +33,4 @@ class Circle():
 
     def area(self):
         """Return circle area."""
-        return math.pi * self.radius**2
\ No newline at end of file
+        return math.pi * self.radius**2
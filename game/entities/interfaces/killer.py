@@ -4,6 +4,8 @@ from abc import ABC, abstractmethod
 class Killer(ABC):
     """Interface of objects that could kill."""
 
+    __slots__ = ()
+
     @abstractmethod
     def attempt_murder(self, victim):
         """Tries to kill passed victim. Retruns object
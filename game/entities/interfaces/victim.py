@@ -4,6 +4,8 @@ from abc import ABC, abstractmethod
 class Victim(ABC):
     """Interface of objects that could be killed."""
 
+    __slots__ = ()
+
     @abstractmethod
     def try_to_kill_by(self, killer):
         """Gets objects that tries to kill and returns
@@ -1,9 +1,11 @@
 import functools
 import operator
 import math
+import random
 
 from .. import gameutils as gu
 from . import interfaces
+from .cell import Cell
 from .playercell import PlayerCell
 from .circle import Circle
 
@@ -11,8 +13,12 @@ from .circle import Circle
 class Player(interfaces.Victim, interfaces.Killer):
     """Class that represents player game state."""
 
+    __slots__ = ('id', 'nick', 'parts')
+
     START_SIZE = 40
     BORDER_WIDTH = 5
+    # max number of parts, split stops when player has that many
+    MAX_PARTS = 16
 
     LAST_ID = -1
 
@@ -24,13 +30,37 @@ class Player(interfaces.Victim, interfaces.Killer):
         # self.parts = [PlayerCell(pos, radius, color, border_color)]
 
     def move(self):
-        """Move each part of player and check parts for collision."""
-        for i, cell in enumerate(self.parts):
+        """Move each part of player and check parts for collision.
+        Returns number of checked pairs of parts.
+        """
+        for cell in self.parts:
             cell.move()
-            for another_cell in self.parts[i + 1:]:
-                # cells shoud intersects and not be the same
-                if cell == another_cell or \
-                        not cell.is_intersects(another_cell):
+        return self.collide_parts()
+
+    def collide_parts(self):
+        """Merges or pushes apart intersecting parts.
+        Returns number of checked pairs of parts.
+
+        Parts are sorted by left edge, so only pairs that overlap
+        along x axis are checked (sweep and prune).
+        """
+        if len(self.parts) < 2:
+            return 0
+        parts = sorted(self.parts, key=lambda cell: cell.x - cell.radius)
+        eaten = set()
+        checked = 0
+        for i, cell in enumerate(parts):
+            if cell in eaten:
+                continue
+            for another_cell in parts[i + 1:]:
+                # the rest of parts start to the right of current one,
+                # it is moved and grows, so its edge is taken every time
+                if another_cell.x - another_cell.radius >= cell.x + cell.radius:
+                    break
+                if another_cell in eaten:
+                    continue
+                checked += 1
+                if not cell.is_intersects(another_cell):
                     continue
 
                 # merge cells if their timeout is zero
@@ -38,9 +68,12 @@ class Player(interfaces.Victim, interfaces.Killer):
                 if cell.split_timeout == 0 and \
                         another_cell.split_timeout == 0:
                     cell.eat(another_cell)
-                    self.parts.remove(another_cell)
+                    eaten.add(another_cell)
                 else:
                     cell.regurgitate_from(another_cell)
+        if eaten:
+            self.parts = [cell for cell in self.parts if cell not in eaten]
+        return checked
 
     def update_velocity(self, angle, speed):
         """Update velocity of each part."""
@@ -55,28 +88,37 @@ class Player(interfaces.Victim, interfaces.Killer):
             # update velocity of cell
             cell.update_velocity(*rel_vel)
 
-    def shoot(self, angle):
-        """Shoots with cells to given direction."""
+    def shoot(self, angle, ObjClass=Cell):
+        """Shoots with cells to given direction.
+        ObjClass is class or factory of fired cells.
+        """
         emmited = list()
         for cell in self.parts:
             if cell.able_to_shoot():
-                emmited.append(cell.shoot(angle))
+                emmited.append(cell.shoot(angle, ObjClass))
 
         return emmited
 
     def split(self, angle):
+        """Splits parts that are large enough to given direction.
+        When all of them can't split without exceeding MAX_PARTS,
+        the largest ones are splitted. Returns new parts.
+        """
+        able = [cell for cell in self.parts if cell.able_to_split()]
+        room = self.MAX_PARTS - len(self.parts)
+        if len(able) > room:
+            able = sorted(able, key=lambda cell: cell.radius, reverse=True)[:max(room, 0)]
         new_parts = list()
-        for cell in self.parts:
-            if cell.able_to_split():
-                new_parts.append(cell.split(angle))
+        for cell in able:
+            new_parts.append(cell.split(angle))
 
         self.parts.extend(new_parts)
         return new_parts
 
     def center(self):
         """Returns median position of all player cells."""
-        xsum = sum((cell.pos[0] for cell in self.parts))
-        ysum = sum((cell.pos[1] for cell in self.parts))
+        xsum = sum((cell.x for cell in self.parts))
+        ysum = sum((cell.y for cell in self.parts))
         center = [
             xsum/len(self.parts),
             ysum/len(self.parts)]
@@ -128,9 +170,9 @@ class Player(interfaces.Victim, interfaces.Killer):
         self.parts[0].radius = self.START_SIZE
 
     @classmethod
-    def make_random(cls, nick, bounds):
+    def make_random(cls, nick, bounds, rng=random):
         """Returns random player with given nick."""
-        player_cell = PlayerCell.make_random(bounds)
+        player_cell = PlayerCell.make_random(bounds, rng)
         player_cell.radius = cls.START_SIZE
         return cls(nick, player_cell)
 
@@ -1,8 +1,5 @@
 import math
-import enum 
-from operator import add, sub
 
-from .. import gameutils as gu
 from . import interfaces
 from .cell import Cell
 
@@ -10,6 +7,8 @@ from .cell import Cell
 class PlayerCell(Cell, interfaces.Killer):
     """Represents player cell(part of player) state."""
 
+    __slots__ = ('split_timeout', 'area_pool')
+
     BORDER_WIDTH = 5
     MAX_SPEED = 10
     # size of player when created
@@ -88,17 +87,17 @@ class PlayerCell(Cell, interfaces.Killer):
             angle, speed)
         # change current cell radius
         self.spit_out(obj)
-        # find diff_xy to move spawn cell on current circle border
-        diff_xy = gu.polar_to_cartesian(angle, self.radius + radius)
-        # move created object
-        obj.pos = list(map(add, self.pos, diff_xy))
+        # move spawned cell on current circle border
+        dist = self.radius + radius
+        obj.x = self.x + dist*math.cos(angle)
+        obj.y = self.y + dist*math.sin(angle)
         return obj
 
     def attempt_murder(self, victim):
         """Try to kill passed victim cell by self cell."""
         return victim.try_to_kill_by(self)
 
-    def shoot(self, angle):
+    def shoot(self, angle, ObjClass=Cell):
         """Shoot in the given angle.
         Returns the fired cell.
         """
@@ -106,7 +105,7 @@ class PlayerCell(Cell, interfaces.Killer):
             angle, 
             self.SHOOTCELL_SPEED,
             self.SHOOTCELL_RADIUS,
-            Cell)
+            ObjClass)
 
     def able_to_shoot(self):
         """Checks is cell able to shoot."""
@@ -131,21 +130,15 @@ class PlayerCell(Cell, interfaces.Killer):
         It is necessary to get rid of the collision beetwen them.
         """
         # get vector that connects two centers, to detemine direction
-        centers_vec = list(map(
-            sub,
-            self.pos,
-            cell.pos))
+        dx = self.x - cell.x
+        dy = self.y - cell.y
         # get angle of contact
-        angle = gu.cartesian_to_polar(*centers_vec)[0]
+        angle = math.atan2(dy, dx)
         # intersection length
-        delta = self.radius + cell.radius - self.distance_to(cell)
-        # get delta in cartesian coordinate system
-        d_xy = gu.polar_to_cartesian(angle, delta)
+        delta = self.radius + cell.radius - math.hypot(dx, dy)
         # move current cell outside passed cell
-        self.pos = list(map(
-            add,
-            self.pos,
-            d_xy))
+        self.x += delta*math.cos(angle)
+        self.y += delta*math.sin(angle)
 
     def area(self):
         """Returns full PlayerCell area, including area stored in pool."""
@@ -0,0 +1,94 @@
+import random
+
+from . import gameutils as gu
+from .entities import Cell
+
+
+class CellPool():
+    """Free list of removed cells, so new cells reuse them
+    instead of being allocated.
+    """
+
+    # max number of kept cells
+    SIZE = 4096
+
+    def __init__(self, size=SIZE):
+        self.size = size
+        self.cells = list()
+
+    def __len__(self):
+        return len(self.cells)
+
+    def make(self, pos, radius, color, angle=0, speed=0):
+        """Returns cell with passed state, reused cell gets new id,
+        so clients don't confuse it with removed one.
+        """
+        if not self.cells:
+            return Cell(pos, radius, color, angle, speed)
+        cell = self.cells.pop()
+        Cell.__init__(cell, pos, radius, color, angle, speed)
+        return cell
+
+    def release(self, cell):
+        """Takes removed cell, nothing else must refer to it.
+        Only plain cells are kept, stored and player cells are not.
+        """
+        if type(cell) is Cell and len(self.cells) < self.size:
+            self.cells.append(cell)
+
+
+class FoodManager():
+    """Keeps number of cells in every chunk close to the target.
+
+    Target of each chunk is proportional to the part of the world that
+    it covers. Chunks are visited in turns and at most budget cells
+    are spawned per update, so eaten food grows back gradually.
+    """
+
+    # max number of cells spawned per update
+    BUDGET = 10
+
+    def __init__(self, model, cell_num, budget=BUDGET):
+        self.model = model
+        self.budget = budget
+        # (chunk, target number of cells, rect of the world in chunk)
+        self.slots = list()
+        bounds, size = model.bounds, model.chunk_size
+        density = cell_num / (4 * bounds[0] * bounds[1])
+        for i, column in enumerate(model.chunks):
+            for j, chunk in enumerate(column):
+                left = -bounds[0] + i*size
+                bottom = -bounds[1] + j*size
+                right = min(left + size, bounds[0])
+                top = min(bottom + size, bounds[1])
+                target = round(density * (right - left) * (top - bottom))
+                if target > 0:
+                    self.slots.append((chunk, target, (left, bottom, right, top)))
+        # index of the slot that is checked first on next update
+        self.cursor = 0
+
+    def update(self):
+        """Spawns cells in chunks that lack them.
+        Returns number of spawned cells.
+        """
+        budget = self.budget
+        for _ in range(len(self.slots)):
+            chunk, target, rect = self.slots[self.cursor]
+            missing = min(target - len(chunk.cells), budget)
+            for _ in range(missing):
+                self.model.add_cell(self.make_cell(rect))
+            budget -= max(missing, 0)
+            if budget == 0:
+                # chunk could lack more cells, it is checked again next time
+                break
+            self.cursor = (self.cursor + 1) % len(self.slots)
+        return self.budget - budget
+
+    def make_cell(self, rect):
+        """Returns random food cell inside passed rect."""
+        rng = random if self.model.rng is None else self.model.rng
+        left, bottom, right, top = rect
+        return self.model.make_cell(
+            [rng.uniform(left, right), rng.uniform(bottom, top)],
+            rng.choices(Cell.SIZES, Cell.SIZES_CUM)[0],
+            gu.random_safe_color(rng))
@@ -13,14 +13,14 @@ def cartesian_to_polar(x, y):
     return [math.atan2(y, x), math.sqrt(x**2 + y**2)]
 
 
-def random_safe_color():
+def random_safe_color(rng=random):
     """Returns random safe color.
 
     Two random values of three RGB is 7 and 255
     and last is in range [0 - 255]
     """
-    lights = (7, 255, random.randint(0, 255))
-    return random.sample(lights, 3)
+    lights = (7, 255, rng.randint(0, 255))
+    return rng.sample(lights, 3)
 
 
 def make_border_color(color):
@@ -34,10 +34,10 @@ def make_border_color(color):
     return list(map(mapper, color))
 
 
-def random_pos(size):
+def random_pos(size, rng=random):
     """Returns random pos in within given size."""
-    return [random.randint(-size[0], size[1]), 
-        random.randint(-size[1], size[1])]
+    return [rng.randint(-size[0], size[1]), 
+        rng.randint(-size[1], size[1])]
 
 
 def velocity_relative_to_pos(vec_pos, angle, speed, pos):
@@ -55,6 +55,37 @@ def velocity_relative_to_pos(vec_pos, angle, speed, pos):
     return rel_vec
 
 
+def view_rect(center, size, scale=1):
+    """Returns rect (left, bottom, right, top) of screen
+    with passed size centered on passed pos.
+    Screen shows more of the world when scale is less than 1.
+    """
+    width, height = size[0]/scale, size[1]/scale
+    return (
+        center[0] - width/2,
+        center[1] - height/2,
+        center[0] + width/2,
+        center[1] + height/2)
+
+
+def view_scale(score, base_score=40, min_scale=0.25):
+    """Returns scale of the screen of player with passed score.
+
+    View zooms out as player grows, so bigger player sees more,
+    but never further than min_scale.
+    """
+    if score <= base_score:
+        return 1
+    return max(min_scale, math.sqrt(base_score / score))
+
+
+def circle_overlaps_rect(pos, radius, rect):
+    """Checks if bounding box of circle overlaps passed rect."""
+    left, bottom, right, top = rect
+    return pos[0] + radius >= left and pos[0] - radius <= right and \
+        pos[1] + radius >= bottom and pos[1] - radius <= top
+
+
 def apply(iter_obj, func):
     """Apply given function to given sequence."""
     for x in iter_obj:
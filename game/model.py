@@ -1,30 +1,119 @@
 import itertools
+import random
 import time
 
 from loguru import logger
 
+from . import collision
+from . import gameutils as gu
+from .cellstore import CellStore
 from .entities import Cell
+from .profiler import Profiler
+
+
+class EntitySet():
+    """Insertion ordered set of entities, that could be changed while
+    it is iterated.
+
+    Removed entity leaves a hole in the list, that iteration skips,
+    so entities removed during iteration are not visited and nothing
+    is copied. Entities added during iteration are not visited too.
+    Holes are squeezed out when the set isn't iterated.
+    """
+
+    def __init__(self, entities=()):
+        # entities and holes (None) in order of adding
+        self.entities = list()
+        # indices of entities in the list
+        self.indices = dict()
+        # number of running iterations
+        self.iterations = 0
+        for entity in entities:
+            self.add(entity)
+
+    def add(self, entity):
+        self.indices[entity] = len(self.entities)
+        self.entities.append(entity)
+
+    def remove(self, entity):
+        self.entities[self.indices.pop(entity)] = None
+        self.__squeeze()
+
+    def __squeeze(self):
+        """Removes holes if they take more than half of the list."""
+        if self.iterations or len(self.entities) < 2*len(self.indices) + 16:
+            return
+        self.entities = [entity for entity in self.entities if entity is not None]
+        self.indices = {entity: i for i, entity in enumerate(self.entities)}
+
+    def __iter__(self):
+        self.iterations += 1
+        try:
+            entities = self.entities
+            for i in range(len(entities)):
+                entity = entities[i]
+                if entity is not None:
+                    yield entity
+        finally:
+            self.iterations -= 1
+            self.__squeeze()
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __contains__(self, entity):
+        return entity in self.indices
 
 
 class Model():
     """Class that represents game state."""
 
     class Chunk():
+        """Bucket of spatial hash. Entities are stored as dict keys,
+        so they could be inserted and deleted in constant time.
+        """
+
         def __init__(self, players=None, cells=None):
             players = list() if players is None else players
             cells = list() if cells is None else cells
-            self.players = players
-            self.cells = cells
+            self.players = dict.fromkeys(players)
+            self.cells = dict.fromkeys(cells)
 
     # duration of round in seconds
     ROUND_DURATION = 240
 
-    def __init__(self, players=None, cells=None, bounds=(1000, 1000), chunk_size=1000):
+    def __init__(self, players=None, cells=None, bounds=(1000, 1000), chunk_size=1000,
+            vectorized=False, clock=time.time, rng=None, cell_pool=None):
         players = list() if players is None else players
         cells = list() if cells is None else cells
+        # source of time in seconds and of random numbers,
+        # model is deterministic when both are, None means functions
+        # of random module, so the model stays picklable
+        self.clock = clock
+        self.rng = rng
+        # removed cells are returned to pool and reused, when it is
+        # set nothing must refer to removed cells, see game.food
+        self.cell_pool = cell_pool
         # means that size of world is [-world_size, world_size]
         self.bounds = bounds
         self.chunk_size = chunk_size
+        # array-backed storage of cells, requires NumPy
+        self.cell_store = CellStore() if vectorized else None
+        # time and counters of update phases, disabled by default
+        self.profiler = Profiler()
+        # spans of chunks in which entities are stored
+        self.__locations = dict()
+        # cells spans are interned, because most cells have the same ones
+        self.__cell_spans_cache = dict()
+        # all entities of the model
+        self.__players = EntitySet()
+        self.__cells = EntitySet()
+        # cells that have speed, the rest don't move, cells get speed
+        # only when they are created, so set is updated by add_cell
+        self.__moving = dict()
+        # entities simulated by another process, they are present
+        # only to be eaten or to eat, see game.sharding
+        self.ghosts = dict()
         self.chunks = list()
         for i in range((self.bounds[0] * 2) // chunk_size + 1):
             self.chunks.append(list())
@@ -36,7 +125,7 @@ class Model():
         for cell in cells:
             self.add_cell(cell)
 
-        self.round_start = time.time()
+        self.round_start = self.clock()
 
     def update_velocity(self, player, angle, speed):
         """Update passed player velocity."""
@@ -44,7 +133,7 @@ class Model():
 
     def shoot(self, player, angle):
         """Shoots into given direction."""
-        emitted_cells = player.shoot(angle)
+        emitted_cells = player.shoot(angle, self.make_cell)
         for cell in emitted_cells:
             self.add_cell(cell)
 
@@ -55,9 +144,8 @@ class Model():
 
     def split(self, player, angle):
         """Splits player."""
-        self.remove_player(player)
         new_parts = player.split(angle)
-        self.add_player(player)
+        self.rechunk_player(player)
 
         if new_parts:
             logger.debug(f'{player} splitted')
@@ -66,44 +154,64 @@ class Model():
 
     def update(self):
         """Updates game state."""
-        if time.time() - self.round_start >= self.ROUND_DURATION:
+        profiler = self.profiler
+        update_start = profiler.start()
+
+        if self.clock() - self.round_start >= self.ROUND_DURATION:
+            start = profiler.start()
             logger.debug('New round was started.')
             self.__reset_players()
-            self.round_start = time.time()
+            self.round_start = self.clock()
+            profiler.stop('round_reset', start, len(self.__players))
 
         # update cells
-        for cell in self.cells:
-            self.remove_cell(cell)
-            cell.move()
-            self.bound_cell(cell)
-            self.add_cell(cell)
-
-        # update players
-        observable_players = self.players
-        for player in observable_players:
-            self.remove_player(player)
-            player.move()
+        start = profiler.start()
+        if self.cell_store is None:
+            # resting cells don't move
+            moving = list(self.__moving)
+            for cell in moving:
+                cell.move()
+                self.bound_cell(cell)
+                if cell.speed == 0:
+                    del self.__moving[cell]
+        else:
+            # move all cells at once and rechunk only moving ones
+            moving = self.cell_store.moving()
+            self.cell_store.move(self.bounds)
+        profiler.stop('cells.move', start, len(moving))
+
+        start = profiler.start()
+        for cell in moving:
+            self.rechunk_cell(cell)
+        profiler.stop('cells.chunks', start, len(moving))
+
+        # update players, players that are eaten during the loop are skipped
+        for player in self.__players:
+            if player in self.ghosts:
+                continue
+            start = profiler.start()
+            checked = player.move()
+            profiler.stop('players.move', start, checked)
+
+            start = profiler.start()
             self.bound_player(player)
-            self.add_player(player)
+            self.rechunk_player(player)
 
-            # get chuncks around player
-            chunks = self.__nearby_chunks(player.center())
-            # get objects that stored in chunks
-            players = list()
-            cells = list()
-            for chunk in chunks:
-                players.extend(chunk.players)
-                cells.extend(chunk.cells)
+            # get objects that stored in chunks overlapped by player,
+            # only they could be eaten by player or eat player
+            chunks = self.__spans_chunks(self.__locations[player])
+            players, cells = self.__entities_in_chunks(chunks)
+            profiler.stop('players.chunks', start, len(chunks))
             
             # check is player killed some cells
-            for cell in cells:
-                killed_cell = player.attempt_murder(cell)
-                if killed_cell:
-                    logger.debug(f'{player} ate {killed_cell}')
-                    self.remove_cell(killed_cell)
-                    # self.cells.remove(killed_cell)
+            start = profiler.start()
+            for killed_cell in collision.eat_cells(player.parts, cells):
+                logger.debug(f'{player} ate {killed_cell}')
+                self.remove_cell(killed_cell)
+            profiler.stop('players.eat_cells', start, len(player.parts) * len(cells))
             
             # check is player killed other players or their parts
+            start = profiler.start()
             for another_player in players:
                 if player == another_player:
                     continue
@@ -112,49 +220,105 @@ class Model():
                     if len(another_player.parts) == 1:
                         logger.debug(f'{player} ate {another_player}')
                         self.remove_player(another_player)
-                        observable_players.remove(another_player)
                         another_player.remove_part(killed_cell)
                     else:
                         logger.debug(f'{player} ate {another_player} part {killed_cell}')
+            profiler.stop('players.eat_players', start, len(players) - 1)
+
+        profiler.stop('update', update_start, len(self.__players) + len(self.__cells))
+
+    def make_cell(self, pos, radius, color, angle=0, speed=0):
+        """Returns new cell, it is reused removed one if model has pool."""
+        if self.cell_pool is None:
+            return Cell(pos, radius, color, angle, speed)
+        return self.cell_pool.make(pos, radius, color, angle, speed)
 
     def spawn_cells(self, amount):
         """Spawn passed amount of cells on the field."""
+        rng = random if self.rng is None else self.rng
         for _ in range(amount):
-            self.add_cell(Cell.make_random(self.bounds))
+            self.add_cell(Cell.make_random(self.bounds, rng))
 
     def bound_cell(self, cell):
-        cell.pos[0] = self.bounds[0] if cell.pos[0] > self.bounds[0] else cell.pos[0]
-        cell.pos[0] = -self.bounds[0] if cell.pos[0] < -self.bounds[0] else cell.pos[0]
+        cell.x = self.bounds[0] if cell.x > self.bounds[0] else cell.x
+        cell.x = -self.bounds[0] if cell.x < -self.bounds[0] else cell.x
 
-        cell.pos[1] = self.bounds[1] if cell.pos[1] > self.bounds[1] else cell.pos[1]
-        cell.pos[1] = -self.bounds[1] if cell.pos[1] < -self.bounds[1] else cell.pos[1]
+        cell.y = self.bounds[1] if cell.y > self.bounds[1] else cell.y
+        cell.y = -self.bounds[1] if cell.y < -self.bounds[1] else cell.y
 
     def bound_player(self, player):
         for cell in player.parts:
             self.bound_cell(cell)
 
     def add_player(self, player):
-        self.__pos_to_chunk(player.center()).players.append(player)
+        self.__insert(player, self.__player_spans(player), 'players')
+        self.__players.add(player)
 
     def add_cell(self, cell):
-        self.__pos_to_chunk(cell.pos).cells.append(cell)
+        """Adds cell to the model. Returns added cell, which is
+        a copy of passed cell when model is vectorized.
+        """
+        if self.cell_store is not None:
+            stored = self.cell_store.add(cell)
+            # passed cell was copied into the store
+            if self.cell_pool is not None:
+                self.cell_pool.release(cell)
+            cell = stored
+        elif cell.speed != 0:
+            self.__moving[cell] = None
+        self.__insert(cell, self.__cell_spans(cell), 'cells')
+        self.__cells.add(cell)
+        return cell
 
     def remove_player(self, player):
-        self.__pos_to_chunk(player.center()).players.remove(player)
+        self.__delete(player, 'players')
+        self.__players.remove(player)
 
     def remove_cell(self, cell):
-        self.__pos_to_chunk(cell.pos).cells.remove(cell)
+        self.__delete(cell, 'cells')
+        self.__cells.remove(cell)
+        self.__moving.pop(cell, None)
+        if self.cell_store is not None:
+            self.cell_store.remove(cell)
+        if self.cell_pool is not None:
+            self.cell_pool.release(cell)
+
+    def rechunk_player(self, player):
+        """Updates chunks of player if its parts entered or left chunks."""
+        self.__rechunk(player, self.__player_spans(player), 'players')
+
+    def rechunk_cell(self, cell):
+        """Updates chunks of cell if it entered or left chunks."""
+        self.__rechunk(cell, self.__cell_spans(cell), 'cells')
+
+    def nearby_entities(self, pos):
+        """Returns players and cells from chunks around passed pos."""
+        return self.__entities_in_chunks(self.__nearby_chunks(pos))
+
+    def entities_in_rect(self, rect):
+        """Returns players and cells that overlap passed rect
+        (left, bottom, right, top).
+        """
+        start = self.profiler.start()
+        spans = (self.__rect_span(*rect),)
+        players, cells = self.__entities_in_chunks(self.__spans_chunks(spans))
+        checked = len(players) + len(cells)
+        players = [
+            player for player in players
+            if any(gu.circle_overlaps_rect(cell.pos, cell.radius, rect)
+                for cell in player.parts)]
+        cells = [
+            cell for cell in cells
+            if gu.circle_overlaps_rect(cell.pos, cell.radius, rect)]
+        self.profiler.stop('entities_in_rect', start, checked)
+        return players, cells
 
     def copy_for_client(self, pos):
-        chunks = self.__nearby_chunks(pos)
-        players = list()
-        cells = list()
-        for chunk in chunks:
-            players.extend(chunk.players)
-            cells.extend(chunk.cells)
-
+        start = self.profiler.start()
+        players, cells = self.nearby_entities(pos)
         model = Model(players, cells, self.bounds, self.chunk_size)
         model.round_start = self.round_start
+        self.profiler.stop('copy_for_client', start, len(players) + len(cells))
         return model
 
     def __reset_players(self):
@@ -187,19 +351,72 @@ class Model():
         
         return chunks
 
+    def __rect_span(self, left, bottom, right, top):
+        """Returns range of chunk indices (i0, j0, i1, j1) that
+        overlap passed rect.
+        """
+        def clamp(index, size):
+            return min(max(int(index), 0), size - 1)
+
+        width, height = len(self.chunks), len(self.chunks[0])
+        return (
+            clamp((left + self.bounds[0]) // self.chunk_size, width),
+            clamp((bottom + self.bounds[1]) // self.chunk_size, height),
+            clamp((right + self.bounds[0]) // self.chunk_size, width),
+            clamp((top + self.bounds[1]) // self.chunk_size, height))
+
+    def __circle_span(self, circle):
+        return self.__rect_span(
+            circle.x - circle.radius, circle.y - circle.radius,
+            circle.x + circle.radius, circle.y + circle.radius)
+
+    def __cell_spans(self, cell):
+        spans = (self.__circle_span(cell),)
+        return self.__cell_spans_cache.setdefault(spans, spans)
+
+    def __player_spans(self, player):
+        return tuple(self.__circle_span(cell) for cell in player.parts)
+
+    def __spans_chunks(self, spans):
+        """Returns list of unique chunks covered by passed spans."""
+        chunks = dict()
+        for i0, j0, i1, j1 in spans:
+            for i in range(i0, i1 + 1):
+                for j in range(j0, j1 + 1):
+                    chunks[self.chunks[i][j]] = None
+        return list(chunks)
+
+    def __entities_in_chunks(self, chunks):
+        """Returns unique players and cells stored in passed chunks."""
+        players = dict()
+        cells = dict()
+        for chunk in chunks:
+            players.update(chunk.players)
+            cells.update(chunk.cells)
+        return list(players), list(cells)
+
+    def __insert(self, entity, spans, kind):
+        """Stores entity in every chunk it overlaps."""
+        for chunk in self.__spans_chunks(spans):
+            getattr(chunk, kind)[entity] = None
+        self.__locations[entity] = spans
+
+    def __delete(self, entity, kind):
+        for chunk in self.__spans_chunks(self.__locations.pop(entity)):
+            del getattr(chunk, kind)[entity]
+
+    def __rechunk(self, entity, spans, kind):
+        if self.__locations[entity] != spans:
+            self.__delete(entity, kind)
+            self.__insert(entity, spans, kind)
+
     @property
     def cells(self):
-        cells = list()
-        for chunks_line in self.chunks:
-            for chunk in chunks_line:
-                cells.extend(chunk.cells)
-        return cells
+        """Set of all cells, it could be changed while it is iterated."""
+        return self.__cells
 
     @property
     def players(self):
-        players = list()
-        for chunks_line in self.chunks:
-            for chunk in chunks_line:
-                players.extend(chunk.players)
-        return players
+        """Set of all players, it could be changed while it is iterated."""
+        return self.__players
     
\ No newline at end of file
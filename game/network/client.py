@@ -1,13 +1,16 @@
 import socket
 import sys
-import pickle
-import time
 
 import pygame
 from loguru import logger
 
 from .menu import MyMenu
+from . import codec
 from .msgtype import MsgType
+from .prediction import Predictor, SnapshotBuffer
+from .receiver import Receiver
+from .snapshot import SnapshotModel, make_player
+from .ticker import Ticker
 from .. import View
 
 
@@ -16,13 +19,23 @@ BACKGROUND_COLOR = (40, 0, 40)
 
 
 class GameConnection():
+    # max number of redraws per second
+    FPS = 60
+    # seconds without snapshots after which connection is considered lost
+    TIMEOUT = 2
+    # number of attempts to resume session after connection is lost
+    RECONNECT_ATTEMPTS = 3
+
     def __init__(self, screen):
         self.screen = screen
         self.player_id = None
+        # token that resumes server session
+        self.token = None
         self.is_in_lobby = False
         self.host = None
         self.port = None
         self.addr_string = None
+        self.clock = pygame.time.Clock()
 
     def connect_to_game(self, get_attrs):
         attrs = get_attrs()
@@ -32,62 +45,128 @@ class GameConnection():
         self.port = int(self.port)
 
         try:
-            # send nickname
-            msg = pickle.dumps({
-                'type': MsgType.CONNECT,
-                'data': nick
-                })
-            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            sock.sendto(msg, (self.host, self.port))
-            logger.debug('Sending {} to {}'.format(msg, self.addr_string))
-
-            # recieving player info
-            data = sock.recv(4096)
-            self.player_id = pickle.loads(data)
-            logger.debug('Recieved {!r} from {}'.format(self.player_id, self.addr_string))
-            
-            # create view to display game
-            view = View(self.screen, None, None)
+            self.token = None
+            sock, tick_rate = self.handshake(nick)
+            self.play(sock, tick_rate, nick)
+        except socket.timeout:
+            logger.error('Server not responding')
+        except OSError as e:
+            logger.error('Connection failed: {}'.format(e))
+        except codec.CodecError as e:
+            logger.error('Unable to decode server message: {}'.format(e))
+
+    def handshake(self, nick):
+        """Sends nickname and token of current session if there is one.
+        Returns new socket and server tick rate.
+        """
+        msg = codec.encode_connect(nick, self.screen.get_size(), self.token)
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.sendto(msg, (self.host, self.port))
+        logger.debug('Sending {} to {}'.format(msg, self.addr_string))
+
+        # recieving player info
+        msgtype, accept = codec.decode(sock.recv(4096))
+        if msgtype != MsgType.ACCEPT:
+            raise codec.CodecError('Expected ACCEPT, got {}'.format(msgtype.name))
+        self.player_id = accept['player_id']
+        self.token = accept['token']
+        logger.debug('Recieved {!r} from {}'.format(accept, self.addr_string))
+        return sock, accept['tick_rate']
+
+    def play(self, sock, tick_rate, nick):
+        """Runs game loop. Inputs are sent with server tick rate,
+        while screen is redrawn with display rate. Snapshots are
+        recieved in background, so the loop never waits for them.
+        Lost connection is resumed with session token, client gives up
+        after RECONNECT_ATTEMPTS attempts that didn't bring snapshots.
+        """
+        attempts = 0
+        try:
             while True:
-                # getting list of pressed buttons
-                keys = list()
-                for event in pygame.event.get():
-                    if event.type == pygame.QUIT:
-                        exit()
-                    elif event.type == pygame.KEYDOWN:
-                        keys.append(event.key)
+                receiver = Receiver(sock)
+                receiver.start()
+                try:
+                    self.render_loop(sock, receiver, tick_rate)
+                    return
+                except socket.timeout:
+                    if receiver.ack is not None:
+                        # connection was resumed, so the outage is over
+                        attempts = 0
+                    if attempts == self.RECONNECT_ATTEMPTS:
+                        raise
+                finally:
+                    receiver.stop()
+                attempts += 1
+                logger.warning('Connection lost, reconnecting')
+                sock.close()
+                sock, tick_rate = self.handshake(nick)
+        finally:
+            # let server free the session at once
+            try:
+                sock.sendto(codec.encode_disconnect(), (self.host, self.port))
+            except OSError:
+                pass
+            sock.close()
+
+    def render_loop(self, sock, receiver, tick_rate):
+        # create view to display game
+        view = View(self.screen, None, None)
+        # snapshots that are drawn with interpolation
+        buffer = SnapshotBuffer(tick_rate)
+        # local player that reacts to inputs immediately
+        predictor = Predictor()
+        # displayed entities, they are updated in place
+        shown = SnapshotModel()
+        # number of the latest sent input
+        seq = 0
+        ticker = Ticker(tick_rate)
+        keys = list()
+        while True:
+            # getting list of pressed buttons
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    exit()
+                elif event.type == pygame.KEYDOWN:
+                    keys.append(event.key)
+
+            # inputs are sent once per server tick
+            while ticker.delay() <= 0:
                 # get mouse position (velocity vector)
                 mouse_pos = view.mouse_pos_to_polar()
+                seq += 1
                 # sending velocity vector and list of pressed keys
-                msg = pickle.dumps({
-                    'type': MsgType.UPDATE,
-                    'data': {
-                        'mouse_pos': mouse_pos,
-                        'keys': keys,
-                        },
-                    })
+                msg = codec.encode_update(mouse_pos, keys, receiver.ack, seq)
                 sock.sendto(msg, (self.host, self.port))
-
-                # getting current player and game model state
-                data = sock.recv(2**16)
-                msg = pickle.loads(data)
-
-                # update view and redraw
-                view.player = None
-                view.model = msg
-                for pl in view.model.players:
-                    if pl.id == self.player_id:
-                        view.player = pl
-                        break
-
-                if view.player is None:
+                keys = list()
+                predictor.push(seq, mouse_pos)
+                ticker.advance()
+
+            if receiver.error is not None:
+                raise receiver.error
+            if receiver.disconnected:
+                logger.info('Server closed the session')
+                return
+            if receiver.idle_time() > self.TIMEOUT:
+                raise socket.timeout()
+
+            snapshot = receiver.take()
+            if snapshot is not None:
+                buffer.add(snapshot)
+                state = snapshot.players.get(self.player_id)
+                if state is None:
                     logger.debug("Player was killed!")
                     return
-
+                predictor.reconcile(
+                    make_player(self.player_id, state),
+                    snapshot.input_ack,
+                    snapshot.bounds)
+
+            if predictor.player is not None:
+                # remote entities are interpolated, local player is predicted
+                view.model = shown.update(buffer.sample(), predictor.player)
+                view.player = predictor.player
                 view.redraw()
-                time.sleep(1/40)
-        except socket.timeout:
-            logger.error('Server not responding')
+            self.clock.tick(self.FPS)
 
 
 def start(width=900, height=600):
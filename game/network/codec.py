@@ -0,0 +1,252 @@
+import math
+import struct
+
+from .msgtype import MsgType
+from .snapshot import Delta
+
+
+# Every message starts with header of format version and message type.
+# All numbers are little-endian. Entity positions and radii are already
+# quantized by snapshot module, so records have fixed layout.
+
+# version of binary format, must be increased on any layout change
+VERSION = 5
+
+# version, message type
+HEADER = struct.Struct('<BB')
+# nickname length, screen width, screen height, reconnect token
+CONNECT = struct.Struct('<BHHI')
+# player id, server tick rate, reconnect token
+ACCEPT = struct.Struct('<IHI')
+# quantized angle, quantized speed, acked snapshot, input number, number of keys
+UPDATE = struct.Struct('<hHIIB')
+# snapshot number, baseline number, acked input, round start, bounds,
+# number of changed cells, changed players, removed cells, removed players
+SNAPSHOT = struct.Struct('<IIIdiiIIII')
+# id, x, y, radius, r, g, b
+CELL = struct.Struct('<IiiHBBB')
+# x, y, radius, r, g, b, angle, speed
+PART = struct.Struct('<iiHBBBhH')
+# id, nickname length, number of parts
+PLAYER = struct.Struct('<IBH')
+# message sequence number, fragment index, number of fragments
+FRAGMENT = struct.Struct('<IHH')
+
+# max size of datagram that doesn't need IP fragmentation
+MTU = 1200
+
+# marks absence of snapshot number
+NO_NUM = 0xFFFFFFFF
+ANGLE_SCALE = 32767 / math.pi
+SPEED_SCALE = 65535
+
+
+class CodecError(ValueError):
+    """Raised when message could not be decoded."""
+    pass
+
+
+def pack_header(msgtype):
+    return HEADER.pack(VERSION, msgtype)
+
+
+def pack_num(num):
+    return NO_NUM if num is None else num
+
+
+def unpack_num(num):
+    return None if num == NO_NUM else num
+
+
+def pack_str(string):
+    """Encodes string, it is truncated to fit in one byte length."""
+    data = string.encode('utf-8')[:255]
+    # drop partially truncated multibyte character
+    return data.decode('utf-8', 'ignore').encode('utf-8')
+
+
+def encode_connect(nick, screen_size, token=None):
+    """Encodes request to join the game, session with passed
+    token is resumed if server still keeps it.
+    """
+    nick = pack_str(nick)
+    return pack_header(MsgType.CONNECT) + \
+        CONNECT.pack(len(nick), *screen_size, pack_num(token)) + nick
+
+
+def encode_accept(player_id, tick_rate, token):
+    return pack_header(MsgType.ACCEPT) + ACCEPT.pack(player_id, tick_rate, token)
+
+
+def encode_disconnect():
+    return pack_header(MsgType.DISCONNECT)
+
+
+def encode_update(mouse_pos, keys, ack, seq=None):
+    angle, speed = mouse_pos
+    keys = keys[:255]
+    return b''.join((
+        pack_header(MsgType.UPDATE),
+        UPDATE.pack(
+            round(angle * ANGLE_SCALE),
+            round(speed * SPEED_SCALE),
+            pack_num(ack),
+            pack_num(seq),
+            len(keys)),
+        struct.pack('<{}I'.format(len(keys)), *keys)))
+
+
+def encode_snapshot(delta):
+    """Encodes snapshot delta."""
+    chunks = [
+        pack_header(MsgType.SNAPSHOT),
+        SNAPSHOT.pack(
+            delta.num,
+            pack_num(delta.baseline),
+            pack_num(delta.input_ack),
+            delta.round_start,
+            *delta.bounds,
+            len(delta.cells),
+            len(delta.players),
+            len(delta.removed_cells),
+            len(delta.removed_players))]
+
+    pack_cell = CELL.pack
+    chunks.extend(
+        pack_cell(cell_id, *state) for cell_id, state in delta.cells.items())
+
+    pack_player, pack_part = PLAYER.pack, PART.pack
+    for player_id, (nick, parts) in delta.players.items():
+        nick = pack_str(nick)
+        chunks.append(pack_player(player_id, len(nick), len(parts)))
+        chunks.append(nick)
+        chunks.extend(pack_part(*state) for state in parts)
+
+    removed = len(delta.removed_cells) + len(delta.removed_players)
+    chunks.append(struct.pack(
+        '<{}I'.format(removed),
+        *delta.removed_cells,
+        *delta.removed_players))
+    return b''.join(chunks)
+
+
+def encode_fragments(data, seq, mtu=MTU):
+    """Splits encoded message into datagrams that fit in mtu.
+    Message that already fits is returned as is.
+    """
+    if len(data) <= mtu:
+        return [data]
+    header_size = HEADER.size + FRAGMENT.size
+    size = mtu - header_size
+    count = (len(data) + size - 1) // size
+    header = pack_header(MsgType.FRAGMENT)
+    return [
+        header + FRAGMENT.pack(seq, i, count) + data[i*size:(i + 1)*size]
+        for i in range(count)]
+
+
+def decode(data):
+    """Decodes message. Returns message type and its data,
+    raises CodecError if message is malformed.
+    """
+    try:
+        version, msgtype = HEADER.unpack_from(data)
+        if version != VERSION:
+            raise CodecError('Unsupported version {}'.format(version))
+        decoder = DECODERS[msgtype]
+        return MsgType(msgtype), decoder(data, HEADER.size)
+    except (struct.error, KeyError, UnicodeDecodeError) as e:
+        raise CodecError('Malformed message') from e
+
+
+def take(data, offset, size):
+    """Returns size bytes of data starting from offset."""
+    chunk = data[offset:offset + size]
+    if len(chunk) != size:
+        raise CodecError('Message is truncated')
+    return chunk
+
+
+def decode_connect(data, offset):
+    size, width, height, token = CONNECT.unpack_from(data, offset)
+    offset += CONNECT.size
+    return {
+        'nick': take(data, offset, size).decode('utf-8'),
+        'screen_size': (width, height),
+        'token': unpack_num(token),
+        }
+
+
+def decode_accept(data, offset):
+    player_id, tick_rate, token = ACCEPT.unpack_from(data, offset)
+    return {
+        'player_id': player_id,
+        'tick_rate': tick_rate,
+        'token': token,
+        }
+
+
+def decode_update(data, offset):
+    angle, speed, ack, seq, keys_num = UPDATE.unpack_from(data, offset)
+    offset += UPDATE.size
+    keys = struct.unpack_from('<{}I'.format(keys_num), data, offset)
+    return {
+        'mouse_pos': (angle / ANGLE_SCALE, speed / SPEED_SCALE),
+        'keys': list(keys),
+        'ack': unpack_num(ack),
+        'seq': unpack_num(seq),
+        }
+
+
+def decode_snapshot(data, offset):
+    (num, baseline, input_ack, round_start, bound_x, bound_y,
+        cells_num, players_num,
+        removed_cells_num, removed_players_num) = SNAPSHOT.unpack_from(data, offset)
+    offset += SNAPSHOT.size
+
+    size = CELL.size * cells_num
+    cells = {
+        record[0]: record[1:]
+        for record in CELL.iter_unpack(take(data, offset, size))}
+    offset += size
+
+    players = dict()
+    for _ in range(players_num):
+        player_id, nick_size, parts_num = PLAYER.unpack_from(data, offset)
+        offset += PLAYER.size
+        nick = take(data, offset, nick_size).decode('utf-8')
+        offset += nick_size
+        size = PART.size * parts_num
+        parts = tuple(PART.iter_unpack(take(data, offset, size)))
+        offset += size
+        players[player_id] = (nick, parts)
+
+    removed = struct.unpack_from(
+        '<{}I'.format(removed_cells_num + removed_players_num),
+        data, offset)
+
+    return Delta(
+        num, unpack_num(baseline), round_start, (bound_x, bound_y),
+        cells, players,
+        list(removed[:removed_cells_num]),
+        list(removed[removed_cells_num:]),
+        unpack_num(input_ack))
+
+
+def decode_fragment(data, offset):
+    seq, index, count = FRAGMENT.unpack_from(data, offset)
+    return seq, index, count, data[offset + FRAGMENT.size:]
+
+
+def decode_disconnect(data, offset):
+    return None
+
+
+DECODERS = {
+    MsgType.CONNECT: decode_connect,
+    MsgType.ACCEPT: decode_accept,
+    MsgType.UPDATE: decode_update,
+    MsgType.SNAPSHOT: decode_snapshot,
+    MsgType.FRAGMENT: decode_fragment,
+    MsgType.DISCONNECT: decode_disconnect,
+    }
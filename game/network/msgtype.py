@@ -3,4 +3,8 @@ from enum import IntEnum
 
 class MsgType(IntEnum):
     CONNECT = 1
-    UPDATE = 2        
\ No newline at end of file
+    UPDATE = 2
+    ACCEPT = 3
+    SNAPSHOT = 4
+    FRAGMENT = 5
+    DISCONNECT = 6
@@ -0,0 +1,52 @@
+from . import codec
+from .msgtype import MsgType
+
+
+class Reassembler():
+    """Collects fragments of messages and decodes complete messages.
+
+    Messages are expected to have increasing sequence numbers, so
+    fragments of messages older than the last completed one are dropped.
+    """
+
+    # max number of partially received messages
+    SIZE = 8
+
+    def __init__(self, size=SIZE):
+        self.size = size
+        # received fragments and their number according to message seq
+        self.partial = dict()
+        # sequence number of the last completed message
+        self.last_seq = None
+
+    def feed(self, datagram):
+        """Returns decoded message type and data if datagram
+        completes message, otherwise returns None.
+        """
+        msgtype, data = codec.decode(datagram)
+        if msgtype != MsgType.FRAGMENT:
+            return msgtype, data
+
+        seq, index, count, chunk = data
+        if self.last_seq is not None and seq <= self.last_seq:
+            return None
+
+        if seq not in self.partial:
+            self.partial[seq] = [[None] * count, 0]
+            # dicts keep insertion order, so the first one is the oldest
+            while len(self.partial) > self.size:
+                del self.partial[next(iter(self.partial))]
+        fragments = self.partial[seq]
+        chunks = fragments[0]
+        if count != len(chunks) or index >= count:
+            raise codec.CodecError('Inconsistent fragment')
+        if chunks[index] is None:
+            chunks[index] = chunk
+            fragments[1] += 1
+        if fragments[1] < count:
+            return None
+
+        self.last_seq = seq
+        for key in [key for key in self.partial if key <= seq]:
+            del self.partial[key]
+        return codec.decode(b''.join(chunks))
@@ -0,0 +1,106 @@
+import time
+
+
+class SnapshotBuffer():
+    """Short buffer of server snapshots.
+
+    Entities are drawn a bit in the past, interpolated between two
+    buffered snapshots, so network jitter doesn't cause stutter.
+    """
+
+    # how far in the past entities are drawn in seconds
+    DELAY = 0.1
+    # max number of buffered snapshots
+    SIZE = 16
+    # how fast estimation of server clock follows late snapshots
+    DRIFT = 0.05
+
+    def __init__(self, tick_rate, delay=DELAY, size=SIZE, clock=time.perf_counter):
+        self.period = 1 / tick_rate
+        self.delay = delay
+        self.size = size
+        self.clock = clock
+        # snapshots ordered by their numbers
+        self.snapshots = list()
+        # local time at which server made snapshot number zero
+        self.offset = None
+
+    def add(self, snapshot):
+        """Buffers snapshot, it must be newer than buffered ones."""
+        offset = self.clock() - snapshot.num * self.period
+        if self.offset is None or offset < self.offset:
+            # snapshot came faster than usual
+            self.offset = offset
+        else:
+            self.offset += (offset - self.offset) * self.DRIFT
+
+        self.snapshots.append(snapshot)
+        if len(self.snapshots) > self.size:
+            del self.snapshots[0]
+
+    def sample(self):
+        """Returns snapshot interpolated for current time or None."""
+        if not self.snapshots:
+            return None
+        num = (self.clock() - self.offset - self.delay) / self.period
+
+        previous = self.snapshots[0]
+        if num <= previous.num:
+            return previous
+        for snapshot in self.snapshots[1:]:
+            if num < snapshot.num:
+                alpha = (num - previous.num) / (snapshot.num - previous.num)
+                return previous.interpolate(snapshot, alpha)
+            previous = snapshot
+        # newer snapshot is late, entities are not extrapolated
+        return previous
+
+
+class Predictor():
+    """Predicts movement of local player.
+
+    Inputs that server has not applied yet are replayed on top of
+    the latest player state received from server, so player reacts
+    to input without waiting for round trip.
+    """
+
+    # max number of inputs waiting for acknowledgement
+    SIZE = 64
+
+    def __init__(self, size=SIZE):
+        self.size = size
+        # world bounds, known from the first snapshot
+        self.bounds = None
+        # predicted player
+        self.player = None
+        # (input number, mouse pos) not applied by server
+        self.inputs = list()
+
+    def push(self, seq, mouse_pos):
+        """Stores sent input and predicts its result."""
+        self.inputs.append((seq, mouse_pos))
+        if len(self.inputs) > self.size:
+            del self.inputs[0]
+        if self.player is not None:
+            self.step(mouse_pos)
+
+    def reconcile(self, player, input_ack, bounds):
+        """Takes player state from server and replays
+        inputs that were sent after acknowledged one.
+        """
+        self.bounds = bounds
+        if input_ack is not None:
+            self.inputs = [
+                (seq, mouse_pos) for seq, mouse_pos in self.inputs
+                if seq > input_ack]
+        self.player = player
+        for _, mouse_pos in self.inputs:
+            self.step(mouse_pos)
+
+    def step(self, mouse_pos):
+        """Simulates player during one server tick."""
+        self.player.update_velocity(*mouse_pos)
+        self.player.move()
+        for cell in self.player.parts:
+            cell.x = min(max(cell.x, -self.bounds[0]), self.bounds[0])
+            cell.y = min(max(cell.y, -self.bounds[1]), self.bounds[1])
@@ -0,0 +1,147 @@
+import math
+
+from . import codec
+from .snapshot import POS_SCALE, RADIUS_SCALE, Snapshot
+
+
+# size of encoded snapshot without entities
+SNAPSHOT_SIZE = codec.HEADER.size + codec.SNAPSHOT.size
+# size of encoded id of removed entity
+REMOVED_SIZE = 4
+
+
+def player_size(state):
+    """Returns size of encoded player state."""
+    nick, parts = state
+    return codec.PLAYER.size + len(codec.pack_str(nick)) + codec.PART.size*len(parts)
+
+
+class UpdateScheduler():
+    """Chooses changes of visible entities that are sent to one client.
+
+    Every changed entity gets priority from its distance to the
+    player, its velocity and size. Priority of entity that is not sent
+    is accumulated, so far and slow entities are sent less often, but
+    they are sent eventually. Changes with the highest accumulated
+    priority are sent until packet reaches the budget, own player and
+    removed entities are always sent.
+    """
+
+    # distance in screen pixels at which priority is halved
+    DISTANCE = 200
+    # movement in world units since the state known to the client
+    # at which priority is doubled
+    MOVEMENT = 10
+    # radius at which priority is doubled
+    SIZE = 40
+    # priority multiplier of entities unknown to the client, also used
+    # for players that splitted or merged
+    NEW = 4
+
+    def __init__(self, budget=None):
+        # max size of encoded snapshot in bytes, None means unlimited
+        self.budget = budget
+        # accumulated priorities of not sent changes according to ids
+        self.cell_priorities = dict()
+        self.player_priorities = dict()
+        # number of changes that were not sent by the last schedule
+        self.deferred = 0
+
+    def reset(self):
+        """Forgets not sent changes, client starts over."""
+        self.cell_priorities = dict()
+        self.player_priorities = dict()
+
+    def priority(self, pos, radius, moved, new, center, scale):
+        """Returns priority of entity change, positions are in world units."""
+        distance = math.hypot(pos[0] - center[0], pos[1] - center[1]) * scale
+        priority = (1 + radius/self.SIZE) * (1 + moved/self.MOVEMENT)
+        if new:
+            priority *= self.NEW
+        return priority / (1 + distance/self.DISTANCE)
+
+    def cell_priority(self, state, known, center, scale):
+        x, y, radius = state[0] / POS_SCALE, state[1] / POS_SCALE, state[2] / RADIUS_SCALE
+        if known is None:
+            return self.priority((x, y), radius, 0, True, center, scale)
+        moved = math.hypot(state[0] - known[0], state[1] - known[1]) / POS_SCALE
+        return self.priority((x, y), radius, moved, False, center, scale)
+
+    def player_priority(self, state, known, center, scale):
+        parts = state[1]
+        new = known is None or len(known[1]) != len(parts)
+        # the most important part defines priority of player
+        priority = 0
+        for i, part in enumerate(parts):
+            if new:
+                moved = 0
+            else:
+                moved = math.hypot(
+                    part[0] - known[1][i][0], part[1] - known[1][i][1]) / POS_SCALE
+            priority = max(priority, self.priority(
+                (part[0] / POS_SCALE, part[1] / POS_SCALE), part[2] / RADIUS_SCALE,
+                moved, new, center, scale))
+        return priority
+
+    def schedule(self, current, baseline, player_id, center, scale=1):
+        """Returns snapshot that client will have after applying
+        delta from baseline, it contains only scheduled changes
+        of current snapshot. Baseline could be None, then client
+        has no entities yet.
+        """
+        known_cells = dict() if baseline is None else baseline.cells
+        known_players = dict() if baseline is None else baseline.players
+        # entities that left the view are removed anyway
+        cells = {
+            key: state for key, state in known_cells.items() if key in current.cells}
+        players = {
+            key: state for key, state in known_players.items() if key in current.players}
+        size = SNAPSHOT_SIZE + REMOVED_SIZE*(
+            len(known_cells) - len(cells) + len(known_players) - len(players))
+
+        # (accumulated priority, is player, id, state) of changes
+        changes = list()
+        cell_priorities, self.cell_priorities = self.cell_priorities, dict()
+        for key, state in current.cells.items():
+            known = known_cells.get(key)
+            if known == state:
+                continue
+            priority = cell_priorities.get(key, 0) + \
+                self.cell_priority(state, known, center, scale)
+            changes.append((priority, False, key, state))
+
+        player_priorities, self.player_priorities = self.player_priorities, dict()
+        for key, state in current.players.items():
+            known = known_players.get(key)
+            if known == state:
+                continue
+            if key == player_id:
+                # own player is predicted by client, it must be fresh
+                players[key] = state
+                size += player_size(state)
+                continue
+            priority = player_priorities.get(key, 0) + \
+                self.player_priority(state, known, center, scale)
+            changes.append((priority, True, key, state))
+
+        changes.sort(key=lambda change: change[0], reverse=True)
+        self.deferred = 0
+        for priority, is_player, key, state in changes:
+            change_size = player_size(state) if is_player else codec.CELL.size
+            if self.budget is not None and size + change_size > self.budget:
+                # smaller changes could still fit
+                self.deferred += 1
+                if is_player:
+                    self.player_priorities[key] = priority
+                else:
+                    self.cell_priorities[key] = priority
+                continue
+            size += change_size
+            if is_player:
+                players[key] = state
+            else:
+                cells[key] = state
+
+        return Snapshot(
+            current.num, current.round_start, current.bounds,
+            cells, players, current.input_ack)
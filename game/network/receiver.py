@@ -0,0 +1,94 @@
+import socket
+import threading
+import time
+
+from loguru import logger
+
+from . import codec
+from .msgtype import MsgType
+from .packets import Reassembler
+from .snapshot import SnapshotHistory
+
+
+class Receiver(threading.Thread):
+    """Receives and decodes server snapshots in background thread.
+
+    Only the newest snapshot is published, if render loop doesn't
+    take it before the next one is received, it is dropped.
+    """
+
+    # seconds after which blocked recv is interrupted to check stop flag
+    POLL_TIMEOUT = 0.1
+
+    def __init__(self, sock):
+        super().__init__(daemon=True)
+        self.sock = sock
+        # snapshots that could be used by server as delta baselines
+        self.history = SnapshotHistory()
+        # collects fragments of large snapshots
+        self.reassembler = Reassembler()
+        # guards published snapshot
+        self.lock = threading.Lock()
+        # the newest snapshot that was not taken yet
+        self.snapshot = None
+        # number of the latest applied snapshot
+        self.ack = None
+        # time of the latest applied snapshot
+        self.last_recv = time.perf_counter()
+        # exception that stopped receiving
+        self.error = None
+        # server closed the session
+        self.disconnected = False
+        self.running = True
+
+    def run(self):
+        self.sock.settimeout(self.POLL_TIMEOUT)
+        try:
+            while self.running:
+                try:
+                    data = self.sock.recv(2**16)
+                except socket.timeout:
+                    continue
+                try:
+                    msg = self.reassembler.feed(data)
+                except codec.CodecError as e:
+                    # one bad datagram doesn't stop receiving
+                    logger.debug('Dropped datagram: {}'.format(e))
+                    continue
+                if msg is not None:
+                    self.handle(*msg)
+        except OSError as e:
+            logger.debug('Receiving stopped: {}'.format(e))
+            self.error = e
+
+    def handle(self, msgtype, delta):
+        if msgtype == MsgType.DISCONNECT:
+            self.disconnected = True
+            return
+        if msgtype != MsgType.SNAPSHOT or \
+                (self.ack is not None and delta.num <= self.ack):
+            return
+        baseline = self.history.get(delta.baseline)
+        if delta.baseline is not None and baseline is None:
+            # baseline is already forgotten, wait for next delta
+            return
+        snapshot = delta.apply(baseline)
+        self.history.add(snapshot)
+        with self.lock:
+            self.snapshot = snapshot
+            self.ack = snapshot.num
+            self.last_recv = time.perf_counter()
+
+    def take(self):
+        """Returns the newest snapshot once or None."""
+        with self.lock:
+            snapshot, self.snapshot = self.snapshot, None
+        return snapshot
+
+    def idle_time(self):
+        """Returns seconds passed since the latest snapshot."""
+        return time.perf_counter() - self.last_recv
+
+    def stop(self):
+        self.running = False
+        self.join()
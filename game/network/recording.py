@@ -0,0 +1,142 @@
+import mmap
+import struct
+from enum import IntEnum
+
+from ..entities import Player, PlayerCell
+
+
+# Recording is a header followed by events appended by server during
+# the session. Server model is deterministic when it is recorded, so
+# the session is repeated by applying events to the model created from
+# header. All numbers are little-endian.
+
+MAGIC = b'AGRC'
+# version of recording format, must be increased on any layout change
+# or change of simulation that makes old recordings replay differently
+VERSION = 4
+
+# magic, version, seed, start time, tick rate, bounds, cells number, vectorized
+HEADER = struct.Struct('<4sHQdHiiIB')
+# tick number, event kind, player id
+EVENT = struct.Struct('<IBI')
+# x, y, r, g, b, screen width, screen height, nickname length
+JOIN = struct.Struct('<ddBBBHHB')
+# angle, speed, number of keys
+INPUT = struct.Struct('<ddB')
+
+
+class Event(IntEnum):
+    # player joined the game
+    JOIN = 1
+    # player input changed
+    INPUT = 2
+    # inputs of the tick were applied and model was updated
+    TICK = 3
+    # player left the game alive
+    LEAVE = 4
+
+
+class RecordingError(ValueError):
+    """Raised when file is not a recording or has unsupported version."""
+    pass
+
+
+class Recorder():
+    """Appends inputs that server applies to the model into file.
+
+    Events are only appended and flushed every tick, so file of crashed
+    server is still readable up to the last complete tick.
+    """
+
+    def __init__(self, path, seed, start_time, tick_rate, bounds, cell_num, vectorized):
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(
+            MAGIC, VERSION, seed, start_time, tick_rate,
+            *bounds, cell_num, vectorized))
+        # the latest recorded mouse pos of each player, input is
+        # recorded only when it changes
+        self.mouse_pos = dict()
+
+    def join(self, tick, player, screen_size):
+        part = player.parts[0]
+        nick = player.nick.encode('utf-8')[:255]
+        self.file.write(EVENT.pack(tick, Event.JOIN, player.id))
+        self.file.write(JOIN.pack(
+            part.x, part.y, *part.color, *screen_size, len(nick)))
+        self.file.write(nick)
+
+    def input(self, tick, player, mouse_pos, keys):
+        if not keys and self.mouse_pos.get(player.id) == mouse_pos:
+            return
+        self.mouse_pos[player.id] = mouse_pos
+        keys = keys[:255]
+        self.file.write(EVENT.pack(tick, Event.INPUT, player.id))
+        self.file.write(INPUT.pack(*mouse_pos, len(keys)))
+        self.file.write(struct.pack('<{}I'.format(len(keys)), *keys))
+
+    def leave(self, tick, player):
+        self.file.write(EVENT.pack(tick, Event.LEAVE, player.id))
+
+    def tick(self, tick):
+        self.file.write(EVENT.pack(tick, Event.TICK, 0))
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class Recording():
+    """Reads recording from memory mapped file, so long sessions
+    are not loaded into memory.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.data) < HEADER.size:
+            raise RecordingError('{} is too short'.format(path))
+        (magic, version, self.seed, self.start_time, self.tick_rate,
+            bound_x, bound_y, self.cell_num, vectorized) = HEADER.unpack_from(self.data)
+        if magic != MAGIC:
+            raise RecordingError('{} is not a recording'.format(path))
+        if version != VERSION:
+            raise RecordingError('Unsupported recording version {}'.format(version))
+        self.bounds = (bound_x, bound_y)
+        self.vectorized = bool(vectorized)
+
+    def events(self):
+        """Yields (tick, kind, player id, data) of each event.
+        Data is (new player, screen size) for JOIN, (mouse pos, keys)
+        for INPUT and None for other events.
+        Incomplete event at the end of file is ignored.
+        """
+        data = self.data
+        offset = HEADER.size
+        try:
+            while offset < len(data):
+                tick, kind, player_id = EVENT.unpack_from(data, offset)
+                offset += EVENT.size
+                if kind == Event.JOIN:
+                    x, y, r, g, b, width, height, nick_size = JOIN.unpack_from(data, offset)
+                    offset += JOIN.size
+                    nick = data[offset:offset + nick_size].decode('utf-8', 'ignore')
+                    offset += nick_size
+                    player = Player(
+                        nick, PlayerCell([x, y], Player.START_SIZE, [r, g, b]))
+                    yield tick, kind, player_id, (player, (width, height))
+                elif kind == Event.INPUT:
+                    angle, speed, keys_num = INPUT.unpack_from(data, offset)
+                    offset += INPUT.size
+                    keys = struct.unpack_from('<{}I'.format(keys_num), data, offset)
+                    offset += 4 * keys_num
+                    yield tick, kind, player_id, ((angle, speed), list(keys))
+                elif kind in (Event.TICK, Event.LEAVE):
+                    yield tick, kind, player_id, None
+                else:
+                    raise RecordingError('Unknown event kind {}'.format(kind))
+        except struct.error:
+            # server was stopped while event was written
+            return
+
+    def close(self):
+        self.data.close()
@@ -1,84 +1,472 @@
-import socketserver
-import pickle
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import json
+import random
+import secrets
+import signal
+import threading
+import time
 
 from loguru import logger
 import pygame
 
+from . import codec
 from .msgtype import MsgType
+from .priority import UpdateScheduler
+from .recording import Recorder
+from .snapshot import Snapshot, SnapshotHistory
+from .ticker import Ticker
 from .. import Model
+from .. import gameutils as gu
+from ..food import CellPool, FoodManager
 from ..entities import Player
+from ..sharding import ShardedModel
+from ..view import View
 
 
-bounds = [1000, 1000]
-cell_num = 150
-model = Model(list(), bounds=bounds)
-model.spawn_cells(cell_num)
+class ClientState():
+    """Server side state of client session.
 
-clients = dict()
+    Session lives while client sends datagrams, every input works as
+    heartbeat. Client that changed address resumes the session by
+    its token.
+    """
 
-p = Player.make_random("Jetraid", bounds)
+    def __init__(self, player, screen_size, addr, token, budget=None):
+        self.player = player
+        # size of client screen, defines visible area of the world
+        self.screen_size = screen_size
+        # address that snapshots are sent to
+        self.addr = addr
+        # secret number that client passes to resume the session
+        self.token = token
+        # time of the latest datagram from the client
+        self.last_seen = time.perf_counter()
+        # latest recieved mouse position (velocity vector)
+        self.mouse_pos = (0, 0)
+        # keys that were pressed since last tick
+        self.keys = list()
+        # last known player center, used when player is dead
+        self.pos = player.center()
+        # last known scale of client view, it zooms out as player grows
+        self.scale = gu.view_scale(player.score())
+        # snapshots that were sent to the client
+        self.history = SnapshotHistory()
+        # number of the latest snapshot acknowledged by the client
+        self.ack = None
+        # number of the latest recieved input
+        self.input_seq = None
+        # number of the latest input applied to the model
+        self.input_ack = None
+        # chooses changes that fit in snapshot size budget
+        self.scheduler = UpdateScheduler(budget)
+        # task that encodes and sends the latest snapshot
+        self.sending = None
 
+    def reconnect(self, addr):
+        """Moves session to new address. Client starts over,
+        so it has no snapshots and input numbers begin again.
+        """
+        self.addr = addr
+        self.history = SnapshotHistory()
+        self.ack = None
+        self.input_seq = None
+        self.scheduler.reset()
 
-class UDPHandler(socketserver.BaseRequestHandler):
-    def handle(self):
-        # getting request
-        msg = pickle.loads(self.request[0])
-        msgtype = msg['type']
-        data = msg['data']
 
-        global clients
-        global model
-        global bounds
+def apply_input(model, player, mouse_pos, keys):
+    """Applies client input of one tick to the player."""
+    for key in keys:
+        if key == pygame.K_w:
+            model.shoot(player, mouse_pos[0])
+        elif key == pygame.K_SPACE:
+            model.split(player, mouse_pos[0])
+    # update player velocity
+    model.update_velocity(player, *mouse_pos)
+
+
+class GameProtocol(asyncio.DatagramProtocol):
+    """Puts received datagrams into the server queue."""
+
+    def __init__(self, server):
+        self.server = server
+
+    def connection_made(self, transport):
+        self.server.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.server.datagrams.put_nowait((data, addr))
+
+    def error_received(self, exc):
+        logger.debug('Socket error: {}'.format(exc))
+
+
+class GameServer():
+    """Asyncio UDP server that advances game model on its own fixed rate clock.
+
+    Datagrams only queue clients input, all queued inputs are applied
+    once per tick and then state is sent to every client. Simulation
+    and snapshots encoding run in executors, so input is handled
+    while they are in progress and slow client doesn't delay others.
+    Simulation has its own thread, so it doesn't wait for encoders.
+    """
+
+    # number of model updates per second
+    TICK_RATE = 30
+    # number of ticks between profiler reports
+    PROFILE_PERIOD = 300
+    # seconds without datagrams after which session is closed
+    SESSION_TIMEOUT = 5
+    # max bytes per second sent to each client
+    BANDWIDTH = 64 * 1024
+    # number of client view redraws per second, see GameConnection.FPS
+    CLIENT_FPS = 60
+
+    def __init__(self, tick_rate=TICK_RATE, bounds=(1000, 1000),
+            cell_num=150, mtu=codec.MTU, vectorized=False, profile=False, regions=1,
+            seed=None, record=None, bandwidth=BANDWIDTH):
+        # max size of sent datagrams
+        self.mtu = mtu
+        # max size of snapshot sent to each client, None means unlimited
+        self.budget = bandwidth // tick_rate if bandwidth else None
+        self.ticker = Ticker(tick_rate)
+        # fraction of the remaining zoom that client camera makes
+        # during one tick, it zooms by View.ZOOM_SPEED each redraw
+        self.zoom_speed = 1 - (1 - View.ZOOM_SPEED) ** (self.CLIENT_FPS / tick_rate)
+        if record is not None and regions > 1:
+            # region workers have their own clocks and random numbers,
+            # while replay repeats session in single model
+            raise ValueError('Session of sharded world could not be recorded')
+        if seed is not None and not 0 <= seed < 2**64:
+            raise ValueError('Seed must be in range [0, 2**64)')
+        if record is not None and seed is None:
+            # recorded session must be deterministic
+            seed = random.randrange(2**64)
+        if seed is None:
+            clock, rng = time.time, None
+        else:
+            # model time depends only on tick number, so the session
+            # could be repeated from recorded inputs
+            clock, rng = self.ticker.game_time, random.Random(seed)
+        if regions > 1:
+            # world is simulated by several processes
+            self.model = ShardedModel(
+                regions, bounds, vectorized=vectorized, clock=clock, rng=rng)
+        else:
+            self.model = Model(
+                list(), bounds=bounds, vectorized=vectorized, clock=clock, rng=rng,
+                cell_pool=CellPool())
+        self.model.spawn_cells(cell_num)
+        # spawns food instead of eaten one
+        self.food = FoodManager(self.model, cell_num)
+        # model profiler is shared with server, so broadcast is profiled too
+        self.profiler = self.model.profiler
+        self.profiler.enabled = profile
+        # writes applied inputs to the file
+        self.recorder = None
+        if record is not None:
+            self.recorder = Recorder(
+                record, seed, self.ticker.start_time, tick_rate,
+                bounds, cell_num, vectorized)
+        # sessions according to client addresses and tokens
+        self.sessions = dict()
+        self.tokens = dict()
+        # clients that are in the game according to their tokens
+        self.clients = dict()
+        # clients that will join or leave the game on next tick
+        self.joining = list()
+        self.leaving = list()
+        # received datagrams with sender addresses
+        self.datagrams = None
+        self.transport = None
+        # address that server is bound to
+        self.address = None
+        # running send tasks, loop keeps only weak references to them
+        self.sending = set()
+        # model updates don't queue behind snapshots encoding
+        # in default executor
+        self.simulation = ThreadPoolExecutor(1, thread_name_prefix='simulation')
+
+    async def serve(self, host, port):
+        """Receives datagrams and runs game loop until cancelled."""
+        loop = asyncio.get_running_loop()
+        self.datagrams = asyncio.Queue()
+        await loop.create_datagram_endpoint(
+            lambda: GameProtocol(self),
+            local_addr=(host, port))
+        self.address = self.transport.get_extra_info('sockname')
+        # profiling is switched on running server by SIGUSR1,
+        # signals are handled only by main thread
+        handles_signal = hasattr(signal, 'SIGUSR1') and \
+            threading.current_thread() is threading.main_thread()
+        if handles_signal:
+            loop.add_signal_handler(signal.SIGUSR1, self.toggle_profile)
+        try:
+            await asyncio.gather(self.handle_datagrams(), self.serve_ticks())
+        finally:
+            self.transport.close()
+            if self.recorder is not None:
+                self.recorder.close()
+            if isinstance(self.model, ShardedModel):
+                self.model.close()
+            self.simulation.shutdown()
+            if handles_signal:
+                loop.remove_signal_handler(signal.SIGUSR1)
+
+    async def handle_datagrams(self):
+        while True:
+            data, addr = await self.datagrams.get()
+            self.handle(data, addr)
+
+    def handle(self, data, addr):
+        """Handles one datagram of client."""
+        try:
+            msgtype, data = codec.decode(data)
+        except codec.CodecError as e:
+            logger.debug('Dropped message from {}: {}'.format(addr, e))
+            return
+
+        client = self.sessions.get(addr)
+        if client is not None:
+            client.last_seen = time.perf_counter()
 
         if msgtype == MsgType.CONNECT:
-            nick = data
-            logger.debug('Recieved {!r} from {}'.format(nick, self.client_address))
-            
-            # make new player with recievd nickname
-            new_player = Player.make_random(nick, bounds)
-
-            # sending created player to client
-            data = pickle.dumps(new_player.id)
-            logger.debug('Sending {!r} to {}'.format(data, self.client_address))
-            socket = self.request[1]
-            socket.sendto(data, self.client_address)
-
-            # add client to list of clients
-            clients[self.client_address] = new_player
-            # add player to game model
-            model.add_player(new_player)
+            logger.debug('Recieved {!r} from {}'.format(data, addr))
+            client = self.connect(addr, data['nick'], data['screen_size'], data['token'])
+
+            # sending player of the session to client,
+            # repeated CONNECT gets the same answer
+            data = codec.encode_accept(client.player.id, self.ticker.rate, client.token)
+            logger.debug('Sending {!r} to {}'.format(data, addr))
+            self.transport.sendto(data, addr)
         elif msgtype == MsgType.UPDATE:
-            mouse_pos = data['mouse_pos']
-            keys = data['keys']
-
-            # define player according to client address
-            player = clients[self.client_address]
-
-            # simulate player actions
-            for key in keys:
-                if key == pygame.K_w:
-                    model.shoot(
-                        player,
-                        mouse_pos[0])
-                elif key == pygame.K_SPACE:
-                    model.split(
-                        player,
-                        mouse_pos[0])
-            # update player velocity and update model state
-            model.update_velocity(player, *mouse_pos)
-            model.update()
-
-            # send player state and game model state to client
-            data = pickle.dumps(model.copy_for_client(player.center()))
-            socket = self.request[1]
-            socket.sendto(data, self.client_address)
-
-
-def start(host='localhost', port=9999):
-    with socketserver.UDPServer((host, port), UDPHandler) as server:
-        logger.info('Server started at {}:{}'.format(host, port))
-        server.serve_forever()
+            # input is applied on next tick
+            self.queue_input(
+                addr,
+                data['mouse_pos'],
+                data['keys'],
+                data['ack'],
+                data['seq'])
+        elif msgtype == MsgType.DISCONNECT and client is not None:
+            logger.debug('{} disconnected'.format(addr))
+            self.leave(client)
+
+    def connect(self, addr, nick, screen_size, token=None):
+        """Returns session of client, that is resumed or new one."""
+        client = self.sessions.get(addr)
+        if client is not None:
+            return client
+
+        client = self.tokens.get(token)
+        if client is not None:
+            logger.debug('{} resumed session of {}'.format(addr, client.addr))
+            del self.sessions[client.addr]
+            client.reconnect(addr)
+            self.sessions[addr] = client
+            return client
+
+        # make new player with recievd nickname
+        new_player = Player.make_random(nick, self.model.bounds)
+        token = secrets.randbits(32)
+        while token in self.tokens or token == codec.NO_NUM:
+            token = secrets.randbits(32)
+        client = ClientState(new_player, screen_size, addr, token, self.budget)
+        self.sessions[addr] = client
+        self.tokens[token] = client
+        # player will be added to the game on next tick
+        self.joining.append(client)
+        return client
+
+    def leave(self, client):
+        """Closes session, its player leaves the game on next tick."""
+        self.forget(client)
+        if client in self.joining:
+            self.joining.remove(client)
+        else:
+            self.leaving.append(client)
+
+    def forget(self, client):
+        """Frees session, so datagrams of the client are not handled."""
+        if self.sessions.get(client.addr) is client:
+            del self.sessions[client.addr]
+        self.tokens.pop(client.token, None)
+
+    def close_idle(self):
+        """Closes sessions of clients that stopped sending datagrams."""
+        now = time.perf_counter()
+        for client in list(self.sessions.values()):
+            if now - client.last_seen > self.SESSION_TIMEOUT:
+                logger.info('Session of {} timed out'.format(client.addr))
+                self.transport.sendto(codec.encode_disconnect(), client.addr)
+                self.leave(client)
+
+    def queue_input(self, addr, mouse_pos, keys, ack, seq=None):
+        """Stores latest client input and acknowledged snapshot
+        number until next tick.
+        """
+        client = self.sessions.get(addr)
+        if client is None:
+            # session was closed, client must connect again
+            logger.debug('Input from unknown client {}'.format(addr))
+            self.transport.sendto(codec.encode_disconnect(), addr)
+            return
+        # reordered older input doesn't override newer one
+        if seq is None or client.input_seq is None or seq > client.input_seq:
+            client.mouse_pos = mouse_pos
+            client.input_seq = seq
+        client.keys.extend(keys)
+        if ack is not None and (client.ack is None or ack > client.ack):
+            client.ack = ack
+
+    async def serve_ticks(self):
+        """Runs game loop with fixed rate."""
+        while True:
+            await asyncio.sleep(max(self.ticker.delay(), 0))
+            await self.tick()
+            self.ticker.advance()
+
+    async def tick(self):
+        """Applies queued inputs, updates model and sends its state."""
+        tick_num = self.ticker.tick_num
+        self.close_idle()
+        leaving, self.leaving = self.leaving, list()
+        for client in leaving:
+            # player could be eaten already
+            if self.clients.pop(client.token, None) is None or not client.player.parts:
+                continue
+            self.model.remove_player(client.player)
+            if self.recorder is not None:
+                self.recorder.leave(tick_num, client.player)
+
+        joining, self.joining = self.joining, list()
+        for client in joining:
+            self.clients[client.token] = client
+            self.model.add_player(client.player)
+            if self.recorder is not None:
+                self.recorder.join(tick_num, client.player, client.screen_size)
+
+        # simulate players actions
+        for client in self.clients.values():
+            player = client.player
+            keys, client.keys = client.keys, list()
+            client.input_ack = client.input_seq
+            if not player.parts:
+                continue
+            if self.recorder is not None:
+                self.recorder.input(tick_num, player, client.mouse_pos, keys)
+            apply_input(self.model, player, client.mouse_pos, keys)
+
+        start = self.profiler.start()
+        spawned = self.food.update()
+        self.profiler.stop('food', start, spawned)
+
+        # datagrams are queued while model is updated
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.simulation, self.model.update)
+        if self.recorder is not None:
+            self.recorder.tick(tick_num)
+
+        start = self.profiler.start()
+        self.broadcast()
+        self.profiler.stop('broadcast', start, len(self.clients))
+
+        if self.profiler.enabled and \
+                self.ticker.tick_num % self.PROFILE_PERIOD == self.PROFILE_PERIOD - 1:
+            self.report_profile()
+
+    def toggle_profile(self):
+        """Enables profiler or reports collected stats and disables it."""
+        if self.profiler.enabled:
+            self.report_profile()
+            self.profiler.enabled = False
+            logger.info('Profiling disabled')
+        else:
+            self.profiler.reset()
+            self.profiler.enabled = True
+            logger.info('Profiling enabled')
+
+    def report_profile(self):
+        """Logs collected phases stats and starts collecting them again."""
+        logger.info('Tick phases: {}'.format(
+            json.dumps(self.profiler.report(), sort_keys=True)))
+        self.profiler.reset()
+
+    def broadcast(self):
+        """Sends to each client changes of visible game state
+        since the last snapshot acknowledged by the client.
+
+        Snapshots are made here, because model is changed by next tick,
+        their encoding and sending is done by separate tasks.
+        """
+        for token, client in list(self.clients.items()):
+            if client.player.parts:
+                client.pos = client.player.center()
+                # client camera eases to the scale of player size, so
+                # view isn't narrowed before client zooms in
+                scale = gu.view_scale(client.player.score())
+                client.scale = min(
+                    scale, client.scale + (scale - client.scale) * self.zoom_speed)
+            else:
+                # client will find out about the death from last state,
+                # its further inputs are answered with DISCONNECT
+                del self.clients[token]
+                self.forget(client)
+
+            # client doesn't get new state until previous one is sent
+            if client.sending is not None and not client.sending.done():
+                continue
+
+            current = Snapshot.from_model(
+                self.ticker.tick_num,
+                self.model,
+                gu.view_rect(client.pos, client.screen_size, client.scale),
+                client.input_ack)
+            # baseline is None until client acks any snapshot,
+            # then delta contains the full snapshot
+            ack = client.ack
+            baseline = client.history.get(ack)
+            if ack is not None:
+                client.history.forget_before(ack)
+            # history keeps state that client will have, not the real one,
+            # so deferred changes are sent in next deltas
+            start = self.profiler.start()
+            snapshot = client.scheduler.schedule(
+                current, baseline, client.player.id, client.pos, client.scale)
+            # counter is number of changes deferred to fit in budget
+            self.profiler.stop('schedule', start, client.scheduler.deferred)
+            client.history.add(snapshot)
+
+            client.sending = asyncio.ensure_future(
+                self.send_snapshot(client.addr, snapshot, baseline))
+            self.sending.add(client.sending)
+            client.sending.add_done_callback(self.sending.discard)
+
+    async def send_snapshot(self, addr, snapshot, baseline):
+        loop = asyncio.get_running_loop()
+        packets = await loop.run_in_executor(
+            None, self.encode_snapshot, snapshot, baseline)
+        for packet in packets:
+            self.transport.sendto(packet, addr)
+
+    def encode_snapshot(self, snapshot, baseline):
+        """Returns datagrams with delta of snapshot."""
+        data = codec.encode_snapshot(snapshot.diff(baseline))
+        # large snapshots are splitted to avoid IP fragmentation
+        return codec.encode_fragments(data, snapshot.num, self.mtu)
+
+
+def start(host='localhost', port=9999, tick_rate=GameServer.TICK_RATE, vectorized=False,
+        profile=False, bounds=(1000, 1000), regions=1, seed=None, record=None,
+        bandwidth=GameServer.BANDWIDTH):
+    server = GameServer(tick_rate, bounds=bounds, vectorized=vectorized,
+        profile=profile, regions=regions, seed=seed, record=record, bandwidth=bandwidth)
+    logger.info('Server started at {}:{} with {} ticks per second'.format(
+        host, port, tick_rate))
+    try:
+        asyncio.run(server.serve(host, port))
+    except KeyboardInterrupt:
+        logger.info('Server stopped')
 
 
 if __name__ == '__main__':
-    start()
\ No newline at end of file
+    start()
@@ -0,0 +1,306 @@
+from .. import Model
+from ..entities import Cell, PlayerCell, Player
+
+
+# positions and radii are quantized to 1/POS_SCALE and 1/RADIUS_SCALE
+# of world unit, so changes smaller than that are not sent to clients
+POS_SCALE = 8
+RADIUS_SCALE = 8
+# velocities of player parts are sent for client side prediction
+ANGLE_SCALE = 10000
+SPEED_SCALE = 1000
+
+
+def cell_state(cell):
+    """Returns comparable quantized state of cell that is needed to draw it.
+    State is tuple of (x, y, radius, r, g, b).
+    """
+    return (
+        round(cell.x * POS_SCALE),
+        round(cell.y * POS_SCALE),
+        round(cell.radius * RADIUS_SCALE),
+        *cell.color)
+
+
+def part_state(cell):
+    """Returns quantized state of player part, that is cell state
+    with (angle, speed) of its velocity.
+    """
+    return cell_state(cell) + (
+        round(cell.angle * ANGLE_SCALE),
+        round(cell.speed * SPEED_SCALE))
+
+
+def player_state(player):
+    """Returns comparable state of player that is needed to draw it."""
+    return (player.nick, tuple(part_state(cell) for cell in player.parts))
+
+
+def make_cell(state, CellClass=Cell):
+    """Creates cell from its quantized state."""
+    x, y, radius, r, g, b, *velocity = state
+    cell = CellClass(
+        [x / POS_SCALE, y / POS_SCALE],
+        radius / RADIUS_SCALE,
+        [r, g, b])
+    if velocity:
+        cell.angle = velocity[0] / ANGLE_SCALE
+        cell.speed = velocity[1] / SPEED_SCALE
+    return cell
+
+
+def set_cell_state(cell, state):
+    """Changes cell to have passed quantized state."""
+    x, y, radius, r, g, b, *velocity = state
+    cell.x = x / POS_SCALE
+    cell.y = y / POS_SCALE
+    cell.radius = radius / RADIUS_SCALE
+    if cell.color[0] != r or cell.color[1] != g or cell.color[2] != b:
+        cell.color = [r, g, b]
+    if velocity:
+        cell.angle = velocity[0] / ANGLE_SCALE
+        cell.speed = velocity[1] / SPEED_SCALE
+
+
+def make_player(player_id, state):
+    """Creates player from its state."""
+    nick, parts = state
+    parts = [make_cell(part, PlayerCell) for part in parts]
+    player = Player(nick, parts[0])
+    player.parts = parts
+    player.id = player_id
+    return player
+
+
+def lerp_state(previous, current, alpha):
+    """Returns state with position and radius between passed states."""
+    return tuple(
+        a + (b - a)*alpha for a, b in zip(previous[:3], current[:3])) + current[3:]
+
+
+class Snapshot():
+    """State of the game world visible to one client."""
+
+    def __init__(self, num, round_start, bounds, cells=None, players=None, input_ack=None):
+        cells = dict() if cells is None else cells
+        players = dict() if players is None else players
+        # sequence number of snapshot
+        self.num = num
+        self.round_start = round_start
+        self.bounds = bounds
+        # cell states according to cell ids
+        self.cells = cells
+        # player states according to player ids
+        self.players = players
+        # number of the latest client input applied before snapshot
+        self.input_ack = input_ack
+
+    @classmethod
+    def from_model(cls, num, model, rect, input_ack=None):
+        """Makes snapshot of entities that overlap passed rect."""
+        players, cells = model.entities_in_rect(rect)
+        snapshot = cls(num, model.round_start, model.bounds, input_ack=input_ack)
+        for cell in cells:
+            snapshot.cells[cell.id] = cell_state(cell)
+        for player in players:
+            snapshot.players[player.id] = player_state(player)
+        return snapshot
+
+    def diff(self, baseline):
+        """Returns delta that turns baseline snapshot into current one.
+        Baseline could be None, then delta contains full snapshot.
+        """
+        if baseline is None:
+            return Delta(
+                self.num, None, self.round_start, self.bounds,
+                self.cells, self.players, input_ack=self.input_ack)
+
+        def changed(current, previous):
+            return {
+                key: state for key, state in current.items()
+                if previous.get(key) != state}
+
+        def removed(current, previous):
+            return [key for key in previous if key not in current]
+
+        return Delta(
+            self.num, baseline.num, self.round_start, self.bounds,
+            changed(self.cells, baseline.cells),
+            changed(self.players, baseline.players),
+            removed(self.cells, baseline.cells),
+            removed(self.players, baseline.players),
+            self.input_ack)
+
+    def interpolate(self, current, alpha):
+        """Returns snapshot between this one and passed newer one.
+        Entities that are missing in this snapshot are taken as is.
+        """
+        cells = dict(current.cells)
+        for key, state in current.cells.items():
+            previous = self.cells.get(key)
+            if previous is not None:
+                cells[key] = lerp_state(previous, state, alpha)
+
+        players = dict(current.players)
+        for key, (nick, parts) in current.players.items():
+            previous = self.players.get(key)
+            # parts could be matched only if player didn't split or merge
+            if previous is not None and len(previous[1]) == len(parts):
+                players[key] = (nick, tuple(
+                    lerp_state(a, b, alpha) for a, b in zip(previous[1], parts)))
+
+        return Snapshot(
+            current.num, current.round_start, current.bounds,
+            cells, players, current.input_ack)
+
+
+class SnapshotModel():
+    """Model that displays snapshots one after another.
+
+    Entities are kept between snapshots, only changed states are
+    applied to them in place, so new model isn't built every frame.
+    """
+
+    def __init__(self):
+        self.model = None
+        # entities and their applied states according to ids
+        self.cells = dict()
+        self.players = dict()
+        # player that is shown instead of its snapshot state
+        self.local_player = None
+
+    def update(self, snapshot, local_player=None):
+        """Makes model show passed snapshot, local player is shown
+        instead of player with the same id. Returns updated model.
+        """
+        model = self.model
+        if model is None or model.bounds != snapshot.bounds:
+            model = self.model = Model(bounds=snapshot.bounds)
+            self.cells = dict()
+            self.players = dict()
+            self.local_player = None
+        model.round_start = snapshot.round_start
+        skip_player = None if local_player is None else local_player.id
+
+        for key in [key for key in self.cells if key not in snapshot.cells]:
+            model.remove_cell(self.cells.pop(key)[0])
+        for key, state in snapshot.cells.items():
+            entry = self.cells.get(key)
+            if entry is None:
+                cell = make_cell(state)
+                cell.id = key
+                self.cells[key] = [model.add_cell(cell), state]
+            elif entry[1] != state:
+                set_cell_state(entry[0], state)
+                entry[1] = state
+                model.rechunk_cell(entry[0])
+
+        for key in [
+                key for key in self.players
+                if key not in snapshot.players or key == skip_player]:
+            model.remove_player(self.players.pop(key)[0])
+        for key, state in snapshot.players.items():
+            if key == skip_player:
+                continue
+            entry = self.players.get(key)
+            if entry is not None and len(entry[1][1]) != len(state[1]):
+                # player splitted or merged, its parts are made again
+                model.remove_player(entry[0])
+                entry = None
+            if entry is None:
+                player = make_player(key, state)
+                model.add_player(player)
+                self.players[key] = [player, state]
+            elif entry[1] != state:
+                player = entry[0]
+                player.nick = state[0]
+                for part, part_state in zip(player.parts, state[1]):
+                    set_cell_state(part, part_state)
+                entry[1] = state
+                model.rechunk_player(player)
+
+        if self.local_player is not local_player:
+            if self.local_player is not None:
+                model.remove_player(self.local_player)
+            self.local_player = local_player
+            if local_player is not None:
+                model.add_player(local_player)
+        elif local_player is not None:
+            model.rechunk_player(local_player)
+        return model
+
+
+class Delta():
+    """Changes of snapshot relative to the baseline snapshot
+    that was acknowledged by the client.
+    """
+
+    def __init__(self, num, baseline, round_start, bounds,
+            cells=None, players=None, removed_cells=None, removed_players=None,
+            input_ack=None):
+        cells = dict() if cells is None else cells
+        players = dict() if players is None else players
+        removed_cells = list() if removed_cells is None else removed_cells
+        removed_players = list() if removed_players is None else removed_players
+        # sequence number of resulting snapshot
+        self.num = num
+        # sequence number of baseline snapshot or None if delta is full
+        self.baseline = baseline
+        self.round_start = round_start
+        self.bounds = bounds
+        # created or changed states according to entity ids
+        self.cells = cells
+        self.players = players
+        # ids of entities that were removed since baseline
+        self.removed_cells = removed_cells
+        self.removed_players = removed_players
+        # number of the latest client input applied before snapshot
+        self.input_ack = input_ack
+
+    def apply(self, baseline):
+        """Returns new snapshot made from baseline and delta."""
+        if self.baseline is None:
+            return Snapshot(
+                self.num, self.round_start, self.bounds,
+                dict(self.cells), dict(self.players), self.input_ack)
+
+        cells = dict(baseline.cells)
+        cells.update(self.cells)
+        for key in self.removed_cells:
+            cells.pop(key, None)
+
+        players = dict(baseline.players)
+        players.update(self.players)
+        for key in self.removed_players:
+            players.pop(key, None)
+
+        return Snapshot(
+            self.num, self.round_start, self.bounds, cells, players, self.input_ack)
+
+
+class SnapshotHistory():
+    """Stores recent snapshots to be used as delta baselines."""
+
+    # max number of stored snapshots
+    SIZE = 32
+
+    def __init__(self, size=SIZE):
+        self.size = size
+        self.snapshots = dict()
+
+    def add(self, snapshot):
+        self.snapshots[snapshot.num] = snapshot
+        # dicts keep insertion order, so the first one is the oldest
+        while len(self.snapshots) > self.size:
+            del self.snapshots[next(iter(self.snapshots))]
+
+    def get(self, num):
+        """Returns snapshot with passed number or None."""
+        return self.snapshots.get(num)
+
+    def forget_before(self, num):
+        """Removes snapshots older than passed number,
+        they can't be used as baselines anymore.
+        """
+        for key in [key for key in self.snapshots if key < num]:
+            del self.snapshots[key]
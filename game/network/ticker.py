@@ -0,0 +1,37 @@
+import time
+
+
+class Ticker():
+    """Keeps fixed rate clock for periodic game updates."""
+
+    # max number of ticks that ticker could lag behind the clock,
+    # after that missed ticks are dropped instead of catching up
+    MAX_LAG = 5
+
+    def __init__(self, rate, clock=time.perf_counter, start_time=None):
+        self.rate = rate
+        self.period = 1 / rate
+        self.clock = clock
+        self.next_tick = self.clock()
+        self.tick_num = 0
+        # wall clock time of the first tick
+        self.start_time = time.time() if start_time is None else start_time
+
+    def delay(self):
+        """Returns time in seconds remaining before next tick."""
+        return self.next_tick - self.clock()
+
+    def advance(self):
+        """Shifts clock to the next tick."""
+        self.tick_num += 1
+        self.next_tick += self.period
+        # drop missed ticks if simulation is too slow
+        if self.clock() - self.next_tick > self.MAX_LAG * self.period:
+            self.next_tick = self.clock()
+
+    def game_time(self):
+        """Returns wall clock time of current tick as if every tick
+        took exactly one period. Unlike real time it depends only
+        on tick number, so simulation could be repeated.
+        """
+        return self.start_time + self.tick_num * self.period
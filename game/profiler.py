@@ -0,0 +1,50 @@
+import time
+
+
+class Profiler():
+    """Collects wall time and counters of named phases.
+
+    Could be enabled and disabled at any time. When it is disabled
+    start and stop do nothing, so hooks cost almost nothing.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        # [calls, total time, max time, counter] according to phase names
+        self.stats = dict()
+
+    def start(self):
+        """Returns start time of phase, None when profiler is disabled."""
+        return time.perf_counter() if self.enabled else None
+
+    def stop(self, phase, start, count=0):
+        """Records time passed since start and adds count
+        (e.g. number of processed entities) to phase counter.
+        """
+        # phase started before profiler was enabled is not recorded
+        if start is None or not self.enabled:
+            return
+        elapsed = time.perf_counter() - start
+        stat = self.stats.get(phase)
+        if stat is None:
+            stat = self.stats[phase] = [0, 0.0, 0.0, 0]
+        stat[0] += 1
+        stat[1] += elapsed
+        if elapsed > stat[2]:
+            stat[2] = elapsed
+        stat[3] += count
+
+    def reset(self):
+        self.stats = dict()
+
+    def report(self):
+        """Returns stats of each phase, times are in milliseconds."""
+        return {
+            phase: {
+                'calls': calls,
+                'total_ms': total * 1000,
+                'mean_ms': total / calls * 1000,
+                'max_ms': longest * 1000,
+                'count': count,
+                }
+            for phase, (calls, total, longest, count) in self.stats.items()}
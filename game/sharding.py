@@ -0,0 +1,564 @@
+import bisect
+import math
+import multiprocessing
+import random
+import time
+
+from loguru import logger
+
+from .cellstore import StoredCell
+from .entities import Cell, PlayerCell, Player
+from .model import Model
+
+
+# max number of regions, ids space is splitted between them
+MAX_REGIONS = 15
+# size of ids range of entities created by one process
+ID_RANGE = 2**32 // (MAX_REGIONS + 1)
+# distance which entities could pass during one tick, with a spare,
+# because ghosts are one tick older than entities of region
+GHOST_SLACK = 50
+
+
+def detach(cell):
+    """Returns cell that could be sent to another process.
+    Stored cells are copied, because their store can't be sent along.
+    """
+    if not isinstance(cell, StoredCell):
+        return cell
+    # copy is created without new id
+    plain = Cell.__new__(Cell)
+    plain.id = cell.id
+    plain.x, plain.y, plain.radius = cell.x, cell.y, cell.radius
+    plain.color = cell.color
+    plain.angle = cell.angle
+    plain.speed = cell.speed
+    return plain
+
+
+class Region():
+    """Vertical strip of the world, that is simulated by one worker."""
+
+    def __init__(self, index, left, right):
+        self.index = index
+        # entities with center in [left, right) belong to region
+        self.left = left
+        self.right = right
+
+    def owns(self, pos):
+        return self.left <= pos[0] < self.right
+
+    @classmethod
+    def split_world(cls, num, bounds, chunk_size):
+        """Splits columns of chunks into num regions of equal width."""
+        columns = (bounds[0] * 2) // chunk_size + 1
+        if num > columns:
+            logger.warning('World has only {} columns of chunks'.format(columns))
+            num = columns
+        regions = list()
+        for i in range(num):
+            left = -bounds[0] + (i * columns // num) * chunk_size
+            right = -bounds[0] + ((i + 1) * columns // num) * chunk_size
+            regions.append(cls(
+                i,
+                -math.inf if i == 0 else left,
+                math.inf if i == num - 1 else right))
+        return regions
+
+    def __repr__(self):
+        return '<{} index={} left={} right={}>'.format(
+            self.__class__.__name__,
+            self.index,
+            self.left,
+            self.right)
+
+
+class RegionModel(Model):
+    """Model of one region.
+
+    Besides entities of the region it contains ghosts of neighbour
+    regions entities. Records changes of own entities, so only they
+    are sent to the coordinator.
+    """
+
+    def __init__(self, bounds, chunk_size, vectorized=False):
+        # own cells according to their ids
+        self.cells_by_id = dict()
+        self.__reset_changes()
+        super().__init__(bounds=bounds, chunk_size=chunk_size, vectorized=vectorized)
+
+    def add_cell(self, cell):
+        cell = super().add_cell(cell)
+        self.cells_by_id[cell.id] = cell
+        self.changed_cells[cell.id] = cell
+        return cell
+
+    def remove_cell(self, cell):
+        super().remove_cell(cell)
+        if cell in self.ghosts:
+            del self.ghosts[cell]
+            self.eaten_cells.append(cell.id)
+        else:
+            del self.cells_by_id[cell.id]
+            self.changed_cells.pop(cell.id, None)
+            self.removed_cells.append(cell.id)
+
+    def remove_player(self, player):
+        super().remove_player(player)
+        if player in self.ghosts:
+            del self.ghosts[player]
+            self.eaten_players.append(player.id)
+        else:
+            self.removed_players.append(player.id)
+
+    def rechunk_cell(self, cell):
+        super().rechunk_cell(cell)
+        # it is called for each moved cell
+        if cell not in self.ghosts:
+            self.changed_cells[cell.id] = cell
+
+    def add_ghost(self, entity):
+        if isinstance(entity, Cell):
+            entity = Model.add_cell(self, entity)
+        else:
+            Model.add_player(self, entity)
+        self.ghosts[entity] = None
+
+    def clear_ghosts(self):
+        """Removes ghosts that were not eaten."""
+        for entity in list(self.ghosts):
+            if isinstance(entity, Cell):
+                Model.remove_cell(self, entity)
+            else:
+                Model.remove_player(self, entity)
+        self.ghosts = dict()
+
+    def hand_off_player(self, player):
+        """Removes player that left the region."""
+        Model.remove_player(self, player)
+
+    def hand_off_cell(self, cell):
+        """Removes cell that left the region. Returns detached copy."""
+        plain = detach(cell)
+        Model.remove_cell(self, cell)
+        del self.cells_by_id[cell.id]
+        self.changed_cells[cell.id] = plain
+        return plain
+
+    def pop_changes(self):
+        """Returns recorded changes and starts recording again."""
+        changes = {
+            'cells': [detach(cell) for cell in self.changed_cells.values()],
+            'removed_cells': self.removed_cells,
+            'removed_players': self.removed_players,
+            'eaten_cells': self.eaten_cells,
+            'eaten_players': self.eaten_players,
+            }
+        self.__reset_changes()
+        return changes
+
+    def __reset_changes(self):
+        # own cells that were added or moved according to their ids
+        self.changed_cells = dict()
+        self.removed_cells = list()
+        self.removed_players = list()
+        # ids of ghosts that were eaten by own players
+        self.eaten_cells = list()
+        self.eaten_players = list()
+
+
+class RegionWorker():
+    """Simulates one region, lives in its own process."""
+
+    def __init__(self, region, bounds, chunk_size, vectorized=False):
+        self.region = region
+        self.model = RegionModel(bounds, chunk_size, vectorized)
+
+    def tick(self, message):
+        """Applies message of the coordinator, updates region
+        and returns its changes.
+        """
+        model = self.model
+        model.round_start = message['round_start']
+        if message['new_round']:
+            for player in model.players:
+                player.reset()
+
+        # entities that were eaten as ghosts in other regions
+        players = {player.id: player for player in model.players}
+        for player_id in message['killed_players']:
+            player = players.pop(player_id, None)
+            if player is not None:
+                model.remove_player(player)
+        for cell_id in message['killed_cells']:
+            cell = model.cells_by_id.get(cell_id)
+            if cell is not None:
+                model.remove_cell(cell)
+
+        # entities that entered the region
+        for player in message['players']:
+            model.add_player(player)
+            players[player.id] = player
+        for cell in message['cells']:
+            model.add_cell(cell)
+
+        for player_id, commands in message['commands'].items():
+            player = players.get(player_id)
+            if player is None or not player.parts:
+                continue
+            for name, args in commands:
+                getattr(model, name)(player, *args)
+
+        for entity in message['ghosts']:
+            model.add_ghost(entity)
+        model.update()
+        model.clear_ghosts()
+        # players of neighbour regions that were not eaten
+        neighbours = [
+            entity for entity in message['ghosts']
+            if isinstance(entity, Player) and entity.parts]
+
+        # entities that left the region are handed off to the coordinator
+        handoff_players = list()
+        for player in list(model.players):
+            if not self.region.owns(player.center()):
+                model.hand_off_player(player)
+                handoff_players.append(player)
+        handoff_cells = [
+            model.hand_off_cell(cell)
+            for cell in list(model.changed_cells.values())
+            if cell.id in model.cells_by_id and not self.region.owns(cell.pos)]
+
+        reply = model.pop_changes()
+        reply['players'] = list(model.players)
+        reply['handoff_players'] = handoff_players
+        reply['handoff_cells'] = handoff_cells
+        reply['left_ghosts'] = self.border_entities(
+            self.region.left, message['margin'], neighbours)
+        reply['right_ghosts'] = self.border_entities(
+            self.region.right, message['margin'], neighbours)
+        return reply
+
+    def border_entities(self, x, margin, neighbours):
+        """Returns own players that are near passed border
+        and own cells that are near players of neighbour region.
+        """
+        if math.isinf(x):
+            return list()
+        players = [
+            player for player in self.model.players
+            if any(abs(part.x - x) <= margin for part in player.parts)]
+
+        # cells could be eaten only by players, so they are replicated
+        # only around players that are on the other side of the border
+        cells = dict()
+        for player in neighbours:
+            if (player.center()[0] < x) != (x == self.region.left):
+                continue
+            for part in player.parts:
+                reach = part.radius + GHOST_SLACK
+                cells.update(dict.fromkeys(self.model.entities_in_rect((
+                    part.x - reach, part.y - reach,
+                    part.x + reach, part.y + reach))[1]))
+        return players + [detach(cell) for cell in cells]
+
+
+def run_region(region, bounds, chunk_size, vectorized, conn):
+    """Serves ticks of coordinator, target of worker process."""
+    # ids of entities created by different processes must not collide
+    Cell.LAST_ID = PlayerCell.LAST_ID = (region.index + 1) * ID_RANGE - 1
+    worker = RegionWorker(region, bounds, chunk_size, vectorized)
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        conn.send(worker.tick(message))
+    conn.close()
+
+
+class ShardedModel():
+    """Game model, which regions are simulated by worker processes.
+
+    The world is splitted into vertical strips of chunks. Entities near
+    borders are replicated to neighbour regions as ghosts, entities that
+    cross borders are handed off. Merged state of all regions is kept
+    in mirror model, that is used to make clients views.
+    Has the same interface as Model for the server.
+    """
+
+    def __init__(self, regions=2, bounds=(1000, 1000), chunk_size=1000, vectorized=False,
+            clock=time.time, rng=None):
+        self.bounds = bounds
+        self.chunk_size = chunk_size
+        self.clock = clock
+        self.rng = rng
+        self.round_start = self.clock()
+        self.regions = Region.split_world(regions, bounds, chunk_size)
+        # left borders of regions, to find region by position
+        self.lefts = [region.left for region in self.regions[1:]]
+        # merged state of regions
+        self.mirror = Model(bounds=bounds, chunk_size=chunk_size)
+        self.profiler = self.mirror.profiler
+        # players and mirror cells according to their ids
+        self.players_by_id = dict()
+        self.cells_by_id = dict()
+        # regions of players according to their ids
+        self.owners = dict()
+        self.__reset_pending()
+        # kills of ghosts, they are sent to all regions
+        self.killed_players = list()
+        self.killed_cells = list()
+        # ghosts of neighbours for each region
+        self.ghosts = [list() for _ in self.regions]
+
+        self.conns = list()
+        self.processes = list()
+        for region in self.regions:
+            conn, worker_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=run_region,
+                args=(region, bounds, chunk_size, vectorized, worker_conn),
+                daemon=True)
+            process.start()
+            self.conns.append(conn)
+            self.processes.append(process)
+        logger.debug('Started {} region workers'.format(len(self.regions)))
+
+    def region_of(self, pos):
+        return self.regions[bisect.bisect_right(self.lefts, pos[0])]
+
+    def update_velocity(self, player, angle, speed):
+        self.__command(player, 'update_velocity', angle, speed)
+
+    def shoot(self, player, angle):
+        self.__command(player, 'shoot', angle)
+
+    def split(self, player, angle):
+        self.__command(player, 'split', angle)
+
+    def add_player(self, player):
+        self.mirror.add_player(player)
+        self.players_by_id[player.id] = player
+        region = self.region_of(player.center())
+        self.owners[player.id] = region.index
+        self.pending_players[region.index].append(player)
+
+    def remove_player(self, player):
+        """Removes player that left the game, region that owns it
+        removes it on next tick like a killed ghost.
+        """
+        self.mirror.remove_player(player)
+        del self.players_by_id[player.id]
+        owner = self.owners.pop(player.id)
+        # player could be not sent to its region yet
+        pending = self.pending_players[owner]
+        if player in pending:
+            pending.remove(player)
+        self.pending_commands[owner].pop(player.id, None)
+        # its ghosts were already made by regions for next tick
+        self.ghosts = [
+            [entity for entity in ghosts if entity.id != player.id or isinstance(entity, Cell)]
+            for ghosts in self.ghosts]
+        self.killed_players.append(player.id)
+
+    def add_cell(self, cell):
+        self.mirror.add_cell(cell)
+        self.cells_by_id[cell.id] = cell
+        region = self.region_of(cell.pos)
+        self.pending_cells[region.index].append(cell)
+        return cell
+
+    def make_cell(self, pos, radius, color, angle=0, speed=0):
+        # cells are pickled to workers, so they are not reused
+        return Cell(pos, radius, color, angle, speed)
+
+    def spawn_cells(self, amount):
+        """Spawn passed amount of cells on the field."""
+        rng = random if self.rng is None else self.rng
+        for _ in range(amount):
+            self.add_cell(Cell.make_random(self.bounds, rng))
+
+    def update(self):
+        """Updates all regions at once and merges their changes."""
+        profiler = self.profiler
+        start = profiler.start()
+        new_round = self.clock() - self.round_start >= Model.ROUND_DURATION
+        if new_round:
+            logger.debug('New round was started.')
+            self.round_start = self.clock()
+        margin = self.ghost_margin()
+        self.__drop_killed()
+
+        for region, conn in zip(self.regions, self.conns):
+            conn.send({
+                'round_start': self.round_start,
+                'new_round': new_round,
+                'killed_players': self.killed_players,
+                'killed_cells': self.killed_cells,
+                'players': self.pending_players[region.index],
+                'cells': self.pending_cells[region.index],
+                'commands': self.pending_commands[region.index],
+                'ghosts': self.ghosts[region.index],
+                'margin': margin,
+                })
+        self.__reset_pending()
+        self.killed_players = list()
+        self.killed_cells = list()
+        # regions are simulated in parallel while replies are awaited
+        replies = [conn.recv() for conn in self.conns]
+        profiler.stop('regions.update', start, len(self.regions))
+
+        start = profiler.start()
+        self.ghosts = [list() for _ in self.regions]
+        for region, reply in zip(self.regions, replies):
+            self.__merge(region, reply)
+        profiler.stop('regions.merge', start, sum(len(reply['cells']) for reply in replies))
+
+    def ghost_margin(self):
+        """Returns distance from border within which entities are
+        replicated to neighbour region. It is the farthest distance
+        from player center which player parts reach.
+        """
+        margin = 0
+        for player in self.mirror.players:
+            center_x = player.center()[0]
+            for cell in player.parts:
+                margin = max(margin, abs(cell.x - center_x) + cell.radius)
+        return margin + GHOST_SLACK
+
+    def entities_in_rect(self, rect):
+        return self.mirror.entities_in_rect(rect)
+
+    def nearby_entities(self, pos):
+        return self.mirror.nearby_entities(pos)
+
+    def copy_for_client(self, pos):
+        model = self.mirror.copy_for_client(pos)
+        model.round_start = self.round_start
+        return model
+
+    def close(self):
+        """Stops worker processes."""
+        for conn in self.conns:
+            conn.send(None)
+        for process in self.processes:
+            process.join()
+        logger.debug('Stopped region workers')
+
+    @property
+    def cells(self):
+        return self.mirror.cells
+
+    @property
+    def chunks(self):
+        return self.mirror.chunks
+
+    @property
+    def players(self):
+        return self.mirror.players
+
+    def __command(self, player, name, *args):
+        """Queues action of player for region that owns it."""
+        commands = self.pending_commands[self.owners[player.id]]
+        commands.setdefault(player.id, list()).append((name, args))
+
+    def __merge(self, region, reply):
+        # remove eaten entities before cells with the same ids are updated
+        for cell_id in reply['removed_cells']:
+            cell = self.cells_by_id.pop(cell_id, None)
+            if cell is not None:
+                self.mirror.remove_cell(cell)
+        for player_id in reply['removed_players']:
+            player = self.players_by_id.pop(player_id, None)
+            if player is not None:
+                self.mirror.remove_player(player)
+                player.parts = list()
+                del self.owners[player_id]
+
+        for state in reply['players']:
+            self.__update_player(state, region)
+        for state in reply['cells']:
+            self.__update_cell(state)
+
+        # eaten ghosts are removed by their regions on next tick
+        self.killed_players.extend(reply['eaten_players'])
+        self.killed_cells.extend(reply['eaten_cells'])
+
+        for state in reply['handoff_players']:
+            owner = self.region_of(state.center())
+            player = self.__update_player(state, owner)
+            if player is not None:
+                self.pending_players[owner.index].append(state)
+        for state in reply['handoff_cells']:
+            self.pending_cells[self.region_of(state.pos).index].append(state)
+
+        if region.index > 0:
+            self.ghosts[region.index - 1].extend(reply['left_ghosts'])
+        if region.index < len(self.regions) - 1:
+            self.ghosts[region.index + 1].extend(reply['right_ghosts'])
+
+    def __drop_killed(self):
+        """Removes entities that were eaten as ghosts from ghosts and
+        hand-offs. Regions made them in the same tick, before they
+        knew about the kills, so otherwise they would be eaten again.
+        """
+        killed_players = set(self.killed_players)
+        killed_cells = set(self.killed_cells)
+        if not killed_players and not killed_cells:
+            return
+
+        def is_killed(entity):
+            if isinstance(entity, Cell):
+                return entity.id in killed_cells
+            return entity.id in killed_players
+
+        self.ghosts = [
+            [entity for entity in ghosts if not is_killed(entity)]
+            for ghosts in self.ghosts]
+
+        # handed off entities don't belong to any region now,
+        # so nobody else removes them from the mirror
+        for i, states in enumerate(self.pending_players):
+            for state in states:
+                if state.id in killed_players:
+                    player = self.players_by_id.pop(state.id, None)
+                    if player is not None:
+                        self.mirror.remove_player(player)
+                        player.parts = list()
+                        del self.owners[state.id]
+            self.pending_players[i] = [
+                state for state in states if state.id not in killed_players]
+        for i, states in enumerate(self.pending_cells):
+            for state in states:
+                if state.id in killed_cells:
+                    cell = self.cells_by_id.pop(state.id, None)
+                    if cell is not None:
+                        self.mirror.remove_cell(cell)
+            self.pending_cells[i] = [
+                state for state in states if state.id not in killed_cells]
+
+    def __update_player(self, state, region):
+        """Updates mirror player with its state sent by region."""
+        player = self.players_by_id.get(state.id)
+        if player is None:
+            return None
+        player.parts = state.parts
+        self.mirror.rechunk_player(player)
+        self.owners[player.id] = region.index
+        return player
+
+    def __update_cell(self, state):
+        """Updates mirror cell with its state sent by region."""
+        cell = self.cells_by_id.get(state.id)
+        if cell is None:
+            self.cells_by_id[state.id] = self.mirror.add_cell(state)
+            return
+        cell.x, cell.y, cell.radius = state.x, state.y, state.radius
+        cell.color = state.color
+        self.mirror.rechunk_cell(cell)
+
+    def __reset_pending(self):
+        # entities and commands that will be sent to regions on next tick
+        self.pending_players = [list() for _ in self.regions]
+        self.pending_cells = [list() for _ in self.regions]
+        self.pending_commands = [dict() for _ in self.regions]
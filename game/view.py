@@ -5,6 +5,7 @@ import pygame
 import pygame.gfxdraw
 
 from . import gameutils as gu
+from .cache import LRUCache
 from .model import Model
 from .entities import Player
 
@@ -16,17 +17,31 @@ class Camera(object):
         # top left point of camera box
         self.x, self.y = x, y
         self.width, self.height = width, height
-        self.scale = 1
+        self.scale = scale
 
     def set_center(self, pos):
         """Change camera postion according to passed center."""
-        self.x = pos[0] - self.width/2
-        self.y = pos[1] + self.height/2
+        self.x = pos[0]*self.scale - self.width/2
+        self.y = pos[1]*self.scale + self.height/2
+
+    def zoom_to(self, scale, speed):
+        """Moves camera scale towards passed one by passed fraction."""
+        self.scale += (scale - self.scale) * speed
 
     def adjust(self, pos):
         """Convert cartesian pos to pos relative to the camera."""
         return  pos[0]*self.scale - self.x, self.y - pos[1]*self.scale
 
+    def world_rect(self):
+        """Returns rect (left, bottom, right, top) of the world
+        that is visible by the camera.
+        """
+        return (
+            self.x / self.scale,
+            (self.y - self.height) / self.scale,
+            (self.x + self.width) / self.scale,
+            self.y / self.scale)
+
 
 class View():
     """"Class that displays model state and shows HUD"""
@@ -42,6 +57,27 @@ class View():
 
     DEBUG_COLOR = (255, 0, 0)
 
+    # max number of cached rendered texts and HUD items
+    TEXT_CACHE_SIZE = 256
+    # max number of cached sprites of bordered circles
+    SPRITE_CACHE_SIZE = 1024
+    # bigger cells are drawn directly, their sprites take too much memory
+    SPRITE_MAX_RADIUS = 128
+    # max number of cached grid tiles
+    GRID_CACHE_SIZE = 8
+    # size of pre-rendered grid tile in grid steps
+    GRID_TILE_STEPS = 16
+    # transparent color of sprites, safe colors never have such lights
+    SPRITE_COLORKEY = (1, 2, 3)
+    # fraction of the remaining zoom that camera makes each frame
+    ZOOM_SPEED = 0.1
+    # smaller food is not drawn, its radius is in pixels
+    FOOD_MIN_RADIUS = 0.5
+    # smaller food is drawn as square dot instead of circle
+    FOOD_DOT_RADIUS = 1.5
+    # nicknames of smaller parts are not drawn
+    NICK_MIN_RADIUS = 15
+
     def __init__(self, screen, model, player, debug=False):
         self.screen = screen
         self.width, self.height = self.screen.get_size()
@@ -55,15 +91,23 @@ class View():
         self.hud_surface = pygame.Surface((1, 1), pygame.SRCALPHA)
         self.hud_surface.fill(View.HUD_BACGROUND_COLOR)
         self.font = pygame.font.Font(pygame.font.get_default_font(), 18)
+        # rendered surfaces, their keys contain everything they depend on
+        self.texts = LRUCache(self.TEXT_CACHE_SIZE)
+        self.hud_items = LRUCache(self.TEXT_CACHE_SIZE)
+        self.sprites = LRUCache(self.SPRITE_CACHE_SIZE)
+        self.grid_tiles = LRUCache(self.GRID_CACHE_SIZE)
 
     def redraw(self):
         """Redraw screen according to model of game."""
+        # view zooms out as player grows, the same way as on server
+        self.camera.zoom_to(gu.view_scale(self.player.score()), self.ZOOM_SPEED)
         self.camera.set_center(self.player.center())
         self.screen.fill(View.BACKGROUND_COLOR)
         self.draw_grid()
-        for cell in self.model.cells:
-            self.draw_cell(cell)
-        for player in self.model.players:
+        # only entities visible by the camera are drawn
+        players, cells = self.model.entities_in_rect(self.camera.world_rect())
+        self.draw_cells(cells)
+        for player in players:
             self.draw_player(player)
         # self.draw_object(self.model.player)
         self.draw_hud((8, 5))
@@ -82,47 +126,113 @@ class View():
                 align_center=True)  
 
     def draw_grid(self, step=25):
-        """Draw grid on screen with passed step."""
+        """Draw grid on screen with passed step by tiling pre-rendered
+        grid surface over the visible part of the world.
+        """
         world_size = self.model.bounds[0]
-        for i in range(-world_size, world_size+step, step):
-            start_coord = (-world_size, i)
-            end_coord = (world_size, i)
-            pygame.draw.line(
-                self.screen, 
-                View.GRID_COLOR, 
-                self.camera.adjust(start_coord), 
-                self.camera.adjust(end_coord), 
-                2)
-            pygame.draw.line(
-                self.screen, 
-                View.GRID_COLOR, 
-                self.camera.adjust(start_coord[::-1]), 
-                self.camera.adjust(end_coord[::-1]), 
-                2)
+        # grid step in pixels, grid is approximate when it is rounded
+        step = max(2, round(step*self.camera.scale))
+        tile = self.grid_tiles.get(step)
+        if tile is None:
+            tile = self.grid_tiles.put(step, self.make_grid_tile(step))
+        size = tile.get_width()
+
+        # world square on the screen, grid lines are 2 pixels wide
+        left, top = map(math.floor, self.camera.adjust((-world_size, world_size)))
+        right, bottom = map(math.floor, self.camera.adjust((world_size, -world_size)))
+        visible = pygame.Rect(left, top, right - left + 2, bottom - top + 2)
+        visible = visible.clip(self.screen.get_rect())
+        if not visible:
+            return
+
+        # tiles are aligned to the world corner
+        start_x = left + (visible.left - left) // size * size
+        start_y = top + (visible.top - top) // size * size
+        self.screen.set_clip(visible)
+        self.screen.blits(
+            [(tile, (x, y))
+                for x in range(start_x, visible.right, size)
+                for y in range(start_y, visible.bottom, size)],
+            doreturn=False)
+        self.screen.set_clip(None)
+
+    def make_grid_tile(self, step):
+        """Returns square surface with several grid cells."""
+        size = step*self.GRID_TILE_STEPS
+        tile = pygame.Surface((size, size))
+        tile.fill(View.BACKGROUND_COLOR)
+        for i in range(0, size, step):
+            tile.fill(View.GRID_COLOR, (i, 0, 2, size))
+            tile.fill(View.GRID_COLOR, (0, i, size, 2))
+        return tile
+
+    def draw_cells(self, cells):
+        """Draw passed cells on the screen. Tiny food is drawn
+        as dots or skipped, because there is lots of it when view is
+        zoomed out.
+        """
+        scale, x, y = self.camera.scale, self.camera.x, self.camera.y
+        fill = self.screen.fill
+        for cell in cells:
+            radius = cell.radius*scale
+            if cell.BORDER_WIDTH != 0 or radius >= self.FOOD_DOT_RADIUS:
+                self.draw_cell(cell)
+            elif radius >= self.FOOD_MIN_RADIUS:
+                fill(cell.color, (cell.x*scale - x - 1, y - cell.y*scale - 1, 2, 2))
 
     def draw_cell(self, cell):
         """Draw passed cell on the screen"""
-        # draw filled circle
-        pygame.draw.circle(
-            self.screen,
-            cell.color,
-            self.camera.adjust(cell.pos),
-            cell.radius)
-        
+        pos = self.camera.adjust(cell.pos)
+        radius = cell.radius*self.camera.scale
+        if cell.BORDER_WIDTH == 0:
+            # plain circle is drawn faster than sprite is looked up
+            pygame.draw.circle(self.screen, cell.color, pos, radius)
+            return
+
+        border_width = max(1, round(cell.BORDER_WIDTH*self.camera.scale))
+        if radius > self.SPRITE_MAX_RADIUS:
+            self.draw_circle(self.screen, cell.color, pos, radius, border_width)
+            return
+
+        radius = round(radius)
+        key = (radius, *cell.color, border_width)
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            sprite = self.sprites.put(
+                key,
+                self.make_sprite(radius, cell.color, border_width))
+        self.screen.blit(sprite, (pos[0] - radius - 1, pos[1] - radius - 1))
+
+    def make_sprite(self, radius, color, border_width):
+        """Returns surface with circle of passed radius in the center."""
+        size = 2*radius + 2
+        sprite = pygame.Surface((size, size))
+        # color key surfaces are blitted much faster than alpha ones
+        sprite.fill(self.SPRITE_COLORKEY)
+        sprite.set_colorkey(self.SPRITE_COLORKEY, pygame.RLEACCEL)
+        self.draw_circle(sprite, color, (radius + 1, radius + 1), radius, border_width)
+        return sprite
+
+    def draw_circle(self, surface, color, pos, radius, border_width):
+        """Draw filled circle with border on passed surface."""
+        pygame.draw.circle(surface, color, pos, radius)
         # draw circle border
-        if cell.BORDER_WIDTH != 0:
+        if border_width != 0:
             pygame.draw.circle(
-                self.screen,
-                gu.make_border_color(cell.color),
-                self.camera.adjust(cell.pos),
-                cell.radius,
-                cell.BORDER_WIDTH)
+                surface,
+                gu.make_border_color(color),
+                pos,
+                radius,
+                border_width)
 
     def draw_player(self, player):
         """Draw passed player on the screen."""
         for cell in player.parts:
             # draw player part
             self.draw_cell(cell)
+            # nickname doesn't fit into small part
+            if cell.radius*self.camera.scale < self.NICK_MIN_RADIUS:
+                continue
             # draw nickname on top of the part
             self.draw_text(
                 self.screen,
@@ -132,7 +242,10 @@ class View():
 
     def draw_text(self, surface, text, pos, color=TEXT_COLOR, align_center=False):
         """Draw passed text on passed surface."""
-        text_surface = self.font.render(text, True, color)
+        key = (text, *color)
+        text_surface = self.texts.get(key)
+        if text_surface is None:
+            text_surface = self.texts.put(key, self.font.render(text, True, color))
         pos = list(pos)
         if align_center:
             # offset pos if was passed center
@@ -166,6 +279,15 @@ class View():
 
     def draw_hud_item(self, pos, lines, maxchars, padding):
         """Draw HUD item with passed string lines."""
+        key = (tuple(lines), padding)
+        item_surface = self.hud_items.get(key)
+        if item_surface is None:
+            item_surface = self.hud_items.put(key, self.make_hud_item(lines, padding))
+        # bilt on main surface
+        self.screen.blit(item_surface, pos)
+
+    def make_hud_item(self, lines, padding):
+        """Returns surface of HUD item with passed string lines."""
         # seacrh max line width
         max_width = max(map(lambda line: self.font.size(line)[0], lines))
         font_height = self.font.get_height()
@@ -181,8 +303,7 @@ class View():
                 item_surface,
                 line,
                 (padding[0], padding[1] + font_height*i))
-        # bilt on main surface
-        self.screen.blit(item_surface, pos)
+        return item_surface
     
     def start(self):
         """Start game loop."""